@@ -1,12 +1,28 @@
+import time
+_t_imports = time.perf_counter()
 import os
-from datetime import timedelta
 from datetime import date as _date
 from numbers import Number
-import plotly.graph_objects as go
-import plotly.express as px
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+import dataset as ds
+import export
+import perf
+import result_cache as rc
+
+# Timing spans of this rerun (see perf.py)
+_perf = perf.Rerun()
+_perf.add('imports', (time.perf_counter() - _t_imports) * 1000.0)
+
+
+def _plotly():
+    # plotly.graph_objects is the slowest import of the app; only charts need it, so it loads on
+    # the first chart instead of delaying the first paint
+    import plotly.graph_objects as go
+    return go
+
 st.set_page_config(page_title="Marketing Metrics", layout="wide")
 
 # Global styles for card visuals
@@ -74,23 +90,38 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# Use Keboola-mounted file only
-data_path = os.path.join(os.sep, 'data', 'in', 'tables', 'marketing_metrics.csv')
-_mtime = os.path.getmtime(data_path)
-df = pd.read_csv(data_path)
-
-# Normalize schema to have period_date
-if 'date' in df.columns:
-    df['period_date'] = pd.to_datetime(df['date'], errors='coerce')
-else:
-    df['period_date'] = pd.to_datetime(df['year_month'].astype(str) + '-01', errors='coerce')
-
-df['year'] = df['period_date'].dt.year.astype('Int64')
-df['month'] = df['period_date'].dt.month.astype('Int64')
+# Use Keboola-mounted tables only. Partitions are loaded lazily per shop and date range and shared
+# by all sessions through dataset.py's memory-bounded cache.
+tables_dir = os.environ.get('DASHBOARD_TABLES_DIR', os.path.join(os.sep, 'data', 'in', 'tables'))
+with _perf.span('discover'):
+    shops = ds.discover_shops(tables_dir)
+    cost_tables = ds.discover_cost_tables(tables_dir)
 
 lang = 'en'
 keboola_logo = "https://www.startupjobs.cz/cdn-cgi/image/w=2688,h=946,f=avif,webp,q=90,fit=cover/https://images-assets.startupjobs.cz/COVER/7213/8b7046b9b5b0f95d5e9ec09d33fdac68.png"
 
+def t(key: str) -> str:
+    labels = {
+        'title': 'Marketing Metrics Dashboard',
+        'orders': 'Orders',
+        'revenue': 'Revenue',
+        'cogs': 'COGS',
+        'cm2': 'CM2',
+        'ad_costs': 'Ad Costs',
+        'cac': 'CAC',
+        'mer': 'MER',
+        'cm3': 'CM3',
+        'roi': 'ROI',
+        'aov': 'AOV',
+        'breakdown': 'Breakdown',
+        'period': 'Period',
+        'google_costs': 'Google Costs',
+        'meta_costs': 'Meta Costs',
+    }
+    return labels.get(key, key)
+
+st.title(t('title'))
+
 # Filters
 with st.sidebar:
     # Top-left Keboola branding above filters
@@ -105,6 +136,12 @@ with st.sidebar:
     )
     # Filters header with an inline delta help tooltip next to Quick ranges
     st.header("Filters")
+    # Shop selector only when the mount holds more than one shop
+    if st.session_state.get('shop') not in shops:
+        st.session_state['shop'] = next(iter(shops))
+    if len(shops) > 1:
+        st.selectbox("Shop", list(shops), key='shop')
+    shop_paths = shops[st.session_state['shop']]
     # Shipping input highlighted when empty
     _ship_val = float(st.session_state.get('shipping_cost', 0.0) or 0.0)
     _ship_bg = "#fde2e7" if _ship_val == 0.0 else "#ffffff"
@@ -120,53 +157,24 @@ with st.sidebar:
         key='shipping_cost',
         label_visibility='collapsed'
     )
-    min_date = pd.to_datetime(df['period_date'].min()).date()
-    max_date = pd.to_datetime(df['period_date'].max()).date()
-    _options = [
-            "Custom",
-            "This month",
-            "Last month",
-            "QTD",
-            "YTD",
-            "Last 30d",
-            "Last 60d",
-            "Last 90d",
-    ]
+    # Branding, title and shipping input are already on screen while the shop's data loads
+    with _perf.span('shop_bounds'), st.spinner("Loading data…"):
+        min_date, max_date = ds.shop_bounds(shop_paths)
+    # Any partition changed on disk starts refreshing now, before cached results are looked up
+    ds.poll_updates(shop_paths)
+    # Version actually served; stays on the previous one while new files load in the background
+    _version = ds.data_version(shop_paths)
+    _options = ds.PRESETS
     _today = _date.today()
     ui_max_date = max(_today, max_date)
-    _anchor_today = _today
+    # Preset and comparison ranges for today and this shop's bounds, built once and looked up
+    _calendar = ds.preset_calendar(_today, min_date, ui_max_date)
 
     def range_for_preset(preset_label: str):
-        anchor = pd.to_datetime(_anchor_today)
-        if preset_label == "This month":
-            p = anchor.to_period('M')
-            s, e = p.start_time.date(), p.end_time.date()
-        elif preset_label == "Last month":
-            prev = (anchor - pd.DateOffset(months=1)).to_period('M')
-            s, e = prev.start_time.date(), prev.end_time.date()
-        elif preset_label == "QTD":
-            q = anchor.to_period('Q')
-            s, e = q.start_time.date(), anchor.date()
-        elif preset_label == "YTD":
-            y = anchor.to_period('Y')
-            s, e = y.start_time.date(), anchor.date()
-        elif preset_label.endswith('d'):
-            days = int(preset_label.split()[1].replace('d',''))
-            s, e = (anchor - timedelta(days=days-1)).date(), anchor.date()
-        else:
-            s, e = (min_date, _anchor_today)
-        # clamp to UI bounds (data filter will naturally limit to available rows)
-        return (max(s, min_date), min(e, ui_max_date))
+        return _calendar['ranges'].get(preset_label, (min_date, _today))
 
     def match_preset_for_range(s: _date, e: _date) -> str:
-        # Compare against computed ranges; return matching label else Custom
-        for opt in _options:
-            if opt == "Custom":
-                continue
-            rs, re = range_for_preset(opt)
-            if rs == s and re == e:
-                return opt
-        return "Custom"
+        return ds.match_preset(_calendar, s, e)
 
     # Initialize session defaults
     if 'preset' not in st.session_state:
@@ -206,18 +214,12 @@ with st.sidebar:
 
     def _expand_to_full_months(dr):
         s, e = _normalize_range(dr)
-        s_p = pd.to_datetime(s).to_period('M')
-        e_p = pd.to_datetime(e).to_period('M')
-        s_full = max(min_date, s_p.start_time.date())
-        e_full = min(ui_max_date, e_p.end_time.date())
-        return (s_full, e_full)
+        return ds.month_span(s, e, min_date, ui_max_date)
 
     def _on_preset_change():
         if st.session_state['preset'] != "Custom":
-            desired = range_for_preset(st.session_state['preset'])
-            if st.session_state.get('granularity', 'Monthly') == 'Monthly':
-                desired = _expand_to_full_months(desired)
-            st.session_state['date_range'] = desired
+            _gran = st.session_state.get('granularity', 'Monthly')
+            st.session_state['date_range'] = _calendar['selection'][_gran][st.session_state['preset']]
 
     def _on_date_change():
         s, e = _normalize_range(st.session_state['date_range'])
@@ -241,6 +243,12 @@ with st.sidebar:
             s, e = expanded
             st.session_state['preset'] = match_preset_for_range(s, e)
 
+    # Keep the picker inside the current shop's bounds (switching shops can leave it outside)
+    _s, _e = _normalize_range(st.session_state['date_range'])
+    _clamped = (min(max(_s, min_date), ui_max_date), min(max(_e, min_date), ui_max_date))
+    if _clamped != (_s, _e):
+        st.session_state['date_range'] = _clamped
+
     # Widgets bound to session_state
     st.markdown("<div style='font-weight:600; margin-bottom:4px;'>Quick ranges</div>", unsafe_allow_html=True)
     preset = st.selectbox("Quick ranges", _options, key='preset', on_change=_on_preset_change, label_visibility='collapsed')
@@ -252,69 +260,31 @@ with st.sidebar:
         on_change=_on_date_change
     )
     granularity = st.selectbox("Breakdown", ["Monthly", "Daily"], key='granularity', on_change=_on_granularity_change)
-    # Table/Plot switch pill: Table | [toggle] | Plot
-    _pill = st.columns([1, 0.5, 1])
-    with _pill[0]:
-        st.markdown("<div class='pill-label right'>Table</div>", unsafe_allow_html=True)
-    with _pill[1]:
-        if 'view_plot' not in st.session_state:
-            st.session_state['view_plot'] = False
-        st.markdown("<div class='pill-mid'>", unsafe_allow_html=True)
-        st.toggle("Plot view", key='view_plot', label_visibility='collapsed')
-        st.markdown("</div>", unsafe_allow_html=True)
-    with _pill[2]:
-        st.markdown("<div class='pill-label left'>Plot</div>", unsafe_allow_html=True)
-
-    # Plot configuration (only relevant when Plot view is active)
-    plot_options = [
-        "Ad Costs vs Revenue vs MER",
-        "MER vs CM3 vs CM2",
-        "Revenue",
-        "Orders",
-        "CAC & ROI",
-        "Costs breakdown: Google+Meta vs Revenue",
-    ]
-    st.selectbox("Plot type", plot_options, index=0, key='plot_type', disabled=(not st.session_state.get('view_plot', False)))
 
     # Final selected range from session_state (normalize to scalar dates)
     start_date, end_date = _normalize_range(st.session_state['date_range'])
 
     # If Monthly breakdown, expand selection to whole months (already synced to picker via callbacks)
     if granularity == "Monthly":
-        _s = pd.to_datetime(start_date).to_period('M')
-        _e = pd.to_datetime(end_date).to_period('M')
-        start_date = max(min_date, _s.start_time.date())
-        end_date = min(ui_max_date, _e.end_time.date())
+        start_date, end_date = ds.month_span(start_date, end_date, min_date, ui_max_date)
 
     start_ts = pd.to_datetime(start_date)
     end_ts = pd.to_datetime(end_date)
-    sel_mask = (df['period_date'] >= start_ts) & (df['period_date'] <= end_ts)
 
-    # (Removed footer branding; branding shown above filters)
-
-fdf = df[sel_mask].copy()
+    def data_status(paths: list, version: tuple):
+        # Refresh state of the shop's data; reruns the app once a refreshed version is swapped in
+        status = ds.refresh_status(paths)
+        if ds.data_version(paths) != version:
+            st.rerun()
+        if status['refreshing']:
+            st.caption("Loading new data… showing the previous version")
+        elif status['refreshed_at'] is not None:
+            st.caption(f"Data refreshed {pd.Timestamp(status['refreshed_at'], unit='s'):%Y-%m-%d %H:%M} UTC")
+        if status['error']:
+            st.caption(f"Last refresh failed ({status['error']}); showing the previous version")
 
-def t(key: str) -> str:
-    labels = {
-        'title': 'Marketing Metrics Dashboard',
-        'orders': 'Orders',
-        'revenue': 'Revenue',
-        'cogs': 'COGS',
-        'cm2': 'CM2',
-        'ad_costs': 'Ad Costs',
-        'cac': 'CAC',
-        'mer': 'MER',
-        'cm3': 'CM3',
-        'roi': 'ROI',
-        'aov': 'AOV',
-        'breakdown': 'Breakdown',
-        'period': 'Period',
-        'google_costs': 'Google Costs',
-        'meta_costs': 'Meta Costs',
-    }
-    return labels.get(key, key)
+    # (Removed footer branding; branding shown above filters)
 
-st.title(t('title'))
 
 def render_card(label: str, value: float | str, unit: str | None = None, delta_pct: float | None = None, tooltip: str | None = None):
     display = value if isinstance(value, str) else f"{float(value):,.2f}"
@@ -341,79 +311,57 @@ def render_card(label: str, value: float | str, unit: str | None = None, delta_p
         </div>
     """, unsafe_allow_html=True)
 
-# Precompute aggregates for selection
-def compute_metrics(dff: pd.DataFrame) -> dict:
-    orders = float(dff['orders'].sum())
-    revenue = float(dff['revenue'].sum())
-    cogs = float(dff['cost_of_goods_sold'].sum()) if 'cost_of_goods_sold' in dff.columns else 0.0
-    # Include shipping cost per order into CM2
-    ship_cost = float(st.session_state.get('shipping_cost', 0.0))
-    cm2 = float(revenue - cogs - (ship_cost * orders))
-    google = float(dff['google_costs'].sum())
-    meta = float(dff['meta_costs'].sum())
-    ad_costs = float(dff.get('ad_costs', dff['google_costs'] + dff['meta_costs']).sum())
-    cm3 = float(cm2 - ad_costs)
-    cac = float(ad_costs / orders) if orders else 0.0
-    mer = float(revenue / ad_costs) if ad_costs else 0.0
-    roi = float(cm3 / ad_costs) if ad_costs else 0.0
-    aov = float(revenue / orders) if orders else 0.0
-    return {
-        'orders': orders,
-        'revenue': revenue,
-        'cogs': cogs,
-        'cm2': cm2,
-        'cm3': cm3,
-        'ad_costs': ad_costs,
-        'google': google,
-        'meta': meta,
-        'cac': cac,
-        'mer': mer,
-        'roi': roi,
-        'aov': aov,
-    }
-
 def pct_change(curr: float, prev: float) -> float:
     if prev == 0:
         return 0.0
     return (curr - prev) / abs(prev) * 100.0
 
-# Current metrics for selected range
-curr = compute_metrics(fdf)
-
-def _compute_prev_range(sel_start: pd.Timestamp, sel_end: pd.Timestamp) -> tuple[pd.Timestamp, pd.Timestamp]:
-    preset = st.session_state.get('preset', 'Custom')
-    gran = st.session_state.get('granularity', 'Monthly')
-    # Helper periods
-    sel_start_m = sel_start.to_period('M')
-    sel_end_m = sel_end.to_period('M')
-    if preset in ("This month", "Last month") and gran == "Monthly":
-        prev_m = sel_start_m - 1
-        return prev_m.start_time, prev_m.end_time
-    if preset == "YTD" and gran == "Monthly":
-        # Jan to current end month of previous year
-        prev_start_y = (sel_start.to_period('Y') - 1).start_time
-        prev_end_y = (sel_end_m - 12).end_time
-        return prev_start_y, prev_end_y
-    if preset == "QTD" and gran == "Monthly":
-        # Previous full quarter
-        curr_q = sel_end.to_period('Q')
-        prev_q = curr_q - 1
-        return prev_q.start_time, prev_q.end_time
-    # Rolling windows like Last 30d/60d/90d or Custom: same-length immediately preceding
-    window_days = (sel_end.normalize() - sel_start.normalize()).days + 1
-    prev_end = sel_start.normalize() - pd.Timedelta(days=1)
-    prev_start = prev_end - pd.Timedelta(days=window_days - 1)
-    return prev_start, prev_end
-
-prev_start, prev_end = _compute_prev_range(start_ts, end_ts)
-
-prev_mask = (df['period_date'] >= prev_start) & (df['period_date'] <= prev_end)
-prevdf = df[prev_mask]
-prev = compute_metrics(prevdf)
+# Comparison window for the KPI deltas
+with _perf.span('prev_range'):
+    prev_start, prev_end = ds.prev_range(
+        _calendar, start_ts, end_ts, st.session_state.get('preset', 'Custom'), st.session_state.get('granularity', 'Monthly')
+    )
+
+# Results are shared across sessions per shop and data version; partitions load only on a miss.
+# Cached values do not depend on the shipping cost: CM2, CM3 and ROI are derived per rerun.
+_shop = st.session_state['shop']
+_ship_cost = float(st.session_state.get('shipping_cost', 0.0))
+
+def _compute_totals() -> tuple[dict, dict]:
+    curr_parts = ds.load_partitions(shop_paths, start_ts, end_ts)
+    prev_parts = ds.load_partitions(shop_paths, prev_start, prev_end)
+    return (
+        ds.partition_totals(curr_parts, start_ts, end_ts),
+        ds.partition_totals(prev_parts, prev_start, prev_end),
+    )
+
+with _perf.span('kpis'):
+    curr_totals, prev_totals = rc.get_or_compute(_shop, _version, ('totals', start_ts, end_ts, prev_start, prev_end), _compute_totals)
+    curr = ds.compute_metrics(curr_totals, _ship_cost)
+    prev = ds.compute_metrics(prev_totals, _ship_cost)
 
 eur = 'EUR'
 pct = '%'
 
+# Breakdown table rows sent to the browser per page
+TABLE_PAGE_ROWS = 366
+# Plotted points per trace above which charts use WebGL and downsampling
+LARGE_SERIES_POINTS = 1000
+
+# Plot types and whether they show shipping-dependent columns (CM2, CM3, ROI)
+PLOT_OPTIONS = {
+    "Ad Costs vs Revenue vs MER": False,
+    "MER vs CM3 vs CM2": True,
+    "Revenue": False,
+    "Orders": False,
+    "CAC & ROI": True,
+    "Costs breakdown: Google+Meta vs Revenue": False,
+}
+
+def _fragment_run() -> perf.Rerun:
+    # Spans join the script's rerun on a full run; a fragment-only rerun gets its own record
+    return perf.Rerun() if _perf.finished else _perf
+
 # Tooltips mapping
 tooltips = {
     t('revenue'): 'Revenue = sum(totalPriceWithoutVat) from Shoptet orders, excluding cancelled lines',
@@ -429,167 +377,186 @@ tooltips = {
     t('meta_costs'): 'Meta Costs = sum(spend) from Meta Ads insights',
 }
 
-# First row: Revenue, Orders, Ad Costs, CAC, ROI
-row1 = st.columns(5)
-with row1[0]:
-    render_card(t('revenue'), curr['revenue'], eur, pct_change(curr['revenue'], prev['revenue']), tooltips[t('revenue')])
-with row1[1]:
-    render_card(t('orders'), curr['orders'], None, pct_change(curr['orders'], prev['orders']), tooltips[t('orders')])
-with row1[2]:
-    render_card(t('ad_costs'), curr['ad_costs'], eur, pct_change(curr['ad_costs'], prev['ad_costs']), tooltips[t('ad_costs')])
-with row1[3]:
-    render_card(t('cac'), curr['cac'], eur, pct_change(curr['cac'], prev['cac']), tooltips[t('cac')])
-with row1[4]:
-    render_card(t('roi'), curr['roi'], pct, pct_change(curr['roi'], prev['roi']), tooltips[t('roi')])
-
-# Second row: CM2, CM3, AOV, Google Costs, Meta Costs
-st.markdown('<div class="row-spacer"></div>', unsafe_allow_html=True)
-row2 = st.columns(5)
-with row2[0]:
-    render_card(t('cm2'), curr['cm2'], eur, pct_change(curr['cm2'], prev['cm2']), tooltips[t('cm2')])
-with row2[1]:
-    render_card(t('cm3'), curr['cm3'], eur, pct_change(curr['cm3'], prev['cm3']), tooltips[t('cm3')])
-with row2[2]:
-    render_card(t('mer'), curr['mer'], None, pct_change(curr['mer'], prev['mer']), tooltips[t('mer')])
-with row2[3]:
-    render_card(t('google_costs'), curr['google'], eur, pct_change(curr['google'], prev['google']), tooltips[t('google_costs')])
-with row2[4]:
-    render_card(t('meta_costs'), curr['meta'], eur, pct_change(curr['meta'], prev['meta']), tooltips[t('meta_costs')])
+def kpi_cards(curr: dict, prev: dict):
+    # No widgets of its own: the cards change only with the sidebar, i.e. on full reruns
+    with _perf.span('cards'):
+        # First row: Revenue, Orders, Ad Costs, CAC, ROI
+        row1 = st.columns(5)
+        with row1[0]:
+            render_card(t('revenue'), curr['revenue'], eur, pct_change(curr['revenue'], prev['revenue']), tooltips[t('revenue')])
+        with row1[1]:
+            render_card(t('orders'), curr['orders'], None, pct_change(curr['orders'], prev['orders']), tooltips[t('orders')])
+        with row1[2]:
+            render_card(t('ad_costs'), curr['ad_costs'], eur, pct_change(curr['ad_costs'], prev['ad_costs']), tooltips[t('ad_costs')])
+        with row1[3]:
+            render_card(t('cac'), curr['cac'], eur, pct_change(curr['cac'], prev['cac']), tooltips[t('cac')])
+        with row1[4]:
+            render_card(t('roi'), curr['roi'], pct, pct_change(curr['roi'], prev['roi']), tooltips[t('roi')])
+
+        # Second row: CM2, CM3, AOV, Google Costs, Meta Costs
+        st.markdown('<div class="row-spacer"></div>', unsafe_allow_html=True)
+        row2 = st.columns(5)
+        with row2[0]:
+            render_card(t('cm2'), curr['cm2'], eur, pct_change(curr['cm2'], prev['cm2']), tooltips[t('cm2')])
+        with row2[1]:
+            render_card(t('cm3'), curr['cm3'], eur, pct_change(curr['cm3'], prev['cm3']), tooltips[t('cm3')])
+        with row2[2]:
+            render_card(t('mer'), curr['mer'], None, pct_change(curr['mer'], prev['mer']), tooltips[t('mer')])
+        with row2[3]:
+            render_card(t('google_costs'), curr['google'], eur, pct_change(curr['google'], prev['google']), tooltips[t('google_costs')])
+        with row2[4]:
+            render_card(t('meta_costs'), curr['meta'], eur, pct_change(curr['meta'], prev['meta']), tooltips[t('meta_costs')])
+
+kpi_cards(curr, prev)
 
 st.divider()
-st.subheader(t('breakdown'))
-
-# Build breakdown table according to granularity
-if st.session_state.get('granularity', 'Monthly') == "Daily":
-    # Show selected range daily rows
-    dff = fdf.copy()
-    dff['date'] = dff['period_date'].dt.strftime('%Y-%m-%d')
-    # Assemble daily view
-    df_show = dff[['date', 'orders', 'google_costs', 'meta_costs', 'ad_costs', 'revenue', 'cost_of_goods_sold', 'cm2', 'cm3', 'cac', 'mer', 'roi', 'aov']].copy()
-    df_show = df_show.sort_values('date')
-    df_plot = df_show.copy()
-    # Use string date as x to avoid month-start normalization
-    df_plot['x'] = df_plot['date']
-else:
-    # Aggregate by month within the selected range only
-    ydf = fdf.copy()
-    ydf['year_month'] = ydf['period_date'].dt.to_period('M').astype(str)
-    agg = ydf.groupby('year_month', as_index=False).agg(
-        orders=('orders', 'sum'),
-        google_costs=('google_costs', 'sum'),
-        meta_costs=('meta_costs', 'sum'),
-        other_costs=('other_costs', 'sum') if 'other_costs' in ydf.columns else ('orders', 'sum'),
-        revenue=('revenue', 'sum'),
-        cogs=('cost_of_goods_sold', 'sum')
-    ).rename(columns={'cogs': 'cost_of_goods_sold'})
-    agg['ad_costs'] = agg['google_costs'] + agg['meta_costs'] + (agg['other_costs'] if 'other_costs' in agg.columns else 0)
-    # Adjust CM2 monthly with shipping cost per order
-    _ship = float(st.session_state.get('shipping_cost', 0.0))
-    agg['cm2'] = agg['revenue'] - agg['cost_of_goods_sold'] - (_ship * agg['orders'])
-    agg['cm3'] = agg['cm2'] - agg['ad_costs']
-    agg['cac'] = agg.apply(lambda r: (r['ad_costs'] / r['orders']) if r['orders'] > 0 else 0.0, axis=1)
-    agg['mer'] = agg.apply(lambda r: (r['revenue'] / r['ad_costs']) if r['ad_costs'] > 0 else 0.0, axis=1)
-    agg['roi'] = agg.apply(lambda r: (r['cm3'] / r['ad_costs']) if r['ad_costs'] > 0 else 0.0, axis=1)
-    agg['aov'] = agg.apply(lambda r: (r['revenue'] / r['orders']) if r['orders'] > 0 else 0.0, axis=1)
-    df_show = agg[['year_month', 'orders', 'google_costs', 'meta_costs', 'ad_costs', 'revenue', 'cost_of_goods_sold', 'cm2', 'cm3', 'cac', 'mer', 'roi', 'aov']].copy()
-    df_show = df_show.sort_values('year_month')
-    df_plot = df_show.copy()
-    # Use month label as x for monthly plots to avoid first-of-month dates in tooltips
-    df_plot['x'] = pd.to_datetime(df_plot['year_month'] + '-01', errors='coerce').dt.strftime('%b %Y')
-
-if not st.session_state.get('view_plot', False):
-    df_show = df_show.reset_index(drop=True)
-    # format all non-date columns to 2 decimals for display
-    display_df = df_show.copy()
-    id_col = 'date' if 'date' in display_df.columns else ('year_month' if 'year_month' in display_df.columns else None)
-    for _col in display_df.columns:
-        if _col != id_col:
-            display_df[_col] = display_df[_col].apply(lambda v: (f"{float(v):.2f}" if pd.notnull(v) else ""))
-    _rows = min(12, len(df_show)) if len(df_show) else 12
-    _row_height = 34
-    _header_height = 38
-    _padding = 16
-    _height = _header_height + (_rows * _row_height) + _padding
-    st.dataframe(display_df, use_container_width=True, height=_height, hide_index=True)
-else:
+
+# Build breakdown table according to granularity; the cached rows are at zero shipping cost
+_granularity = st.session_state.get('granularity', 'Monthly')
+with _perf.span('breakdown') as _span:
+    df_base = rc.get_or_compute(
+        _shop, _version, ('table', start_ts, end_ts, _granularity),
+        lambda: ds.partition_breakdown(ds.load_partitions(shop_paths, start_ts, end_ts), start_ts, end_ts, _granularity, 0.0),
+    )
+    df_show = ds.apply_shipping(df_base, _ship_cost)
+    _span['rows'] = len(df_show)
+
+def plot_frame(df_show: pd.DataFrame, granularity: str) -> pd.DataFrame:
+    # Native datetime x; labels are formatted by the axis and hover templates, not per point.
+    # assign shares the table's columns instead of copying them.
+    if granularity == "Daily":
+        return df_show.assign(x=pd.to_datetime(df_show['date'], format='%Y-%m-%d'))
+    return df_show.assign(x=pd.to_datetime(df_show['year_month'] + '-01', format='%Y-%m-%d'))
+
+def minmax_downsample(y: np.ndarray, max_points: int) -> np.ndarray:
+    # Indices keeping each bucket's min and max (plus both ends), so peaks and dips survive
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    n_buckets = max(1, (max_points - 2) // 2)
+    size = -(-n // n_buckets)
+    pad = n_buckets * size - n
+    # NaNs never win a bucket; padding fills the last bucket to full size
+    lo = np.concatenate([np.where(np.isnan(y), np.inf, y), np.full(pad, np.inf)]).reshape(n_buckets, size)
+    hi = np.concatenate([np.where(np.isnan(y), -np.inf, y), np.full(pad, -np.inf)]).reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    idx = np.unique(np.concatenate([offsets + lo.argmin(axis=1), offsets + hi.argmax(axis=1), [0, n - 1]]))
+    return idx[idx < n]
+
+def build_figure(df_plot: pd.DataFrame, sel: str, is_monthly: bool, x_title: str, overlays: pd.DataFrame | None = None):
+    go = _plotly()
     # Build modern Plotly time-series per selected plot type
-    sel = st.session_state.get('plot_type', 'Ad Costs vs Revenue vs MER')
-    _is_monthly = st.session_state.get('granularity', 'Monthly') == 'Monthly'
-    _x_title = 'Month' if _is_monthly else 'Date'
+    # Epoch milliseconds on a date axis: plotly.js reads them as dates and they ship as a binary array
+    x = df_plot['x'].to_numpy(dtype='datetime64[ms]').astype('int64').astype('float64')
+    # Long ranges switch to WebGL traces and min/max-downsampled series
+    large = len(df_plot) > LARGE_SERIES_POINTS
+    scatter = go.Scattergl if large else go.Scatter
+    x_label, x_format = ('Month', '%b %Y') if is_monthly else ('Date', '%Y-%m-%d')
+
+    def series(y) -> dict:
+        y = np.asarray(y, dtype='float64')
+        if large:
+            idx = minmax_downsample(y, LARGE_SERIES_POINTS)
+            return dict(x=x[idx], y=y[idx])
+        return dict(x=x, y=y)
+
+    def hover(label: str) -> str:
+        return f"{x_label}=%{{x|{x_format}}}<br>{label}=%{{y:.2f}}<extra></extra>"
+
+    def add_overlays(metric: str, label: str, color: str, **kwargs):
+        # Thin rolling-average and previous-year companions of a plotted series (see ds.trend_overlays)
+        if overlays is None:
+            return
+        for suffix, name, dash in (('roll', 'rolling avg', 'dot'), ('yoy', 'previous year', 'dashdot')):
+            col = f'{metric}_{suffix}'
+            if col in overlays.columns:
+                fig.add_trace(scatter(
+                    **series(overlays[col]), mode='lines', name=f'{label} ({name})',
+                    line=dict(color=color, width=1.5, dash=dash), opacity=0.7,
+                    hovertemplate=hover(f'{label} ({name})'), **kwargs
+                ))
+
     fig = go.Figure()
     if sel == 'Ad Costs vs Revenue vs MER':
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['revenue'], mode='lines', name='Revenue (EUR)',
+        fig.add_trace(scatter(
+            **series(df_plot['revenue']), mode='lines', name='Revenue (EUR)',
             line=dict(color='#2563eb', width=2),
-            hovertemplate=('Month=%{x}<br>Revenue (EUR)=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>Revenue (EUR)=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('Revenue (EUR)')
         ))
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['ad_costs'], mode='lines', name='Ad Costs (EUR)',
+        add_overlays('revenue', 'Revenue (EUR)', '#2563eb')
+        fig.add_trace(scatter(
+            **series(df_plot['ad_costs']), mode='lines', name='Ad Costs (EUR)',
             line=dict(color='#dc2626', width=2, dash='dash'),
-            hovertemplate=('Month=%{x}<br>Ad Costs (EUR)=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>Ad Costs (EUR)=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('Ad Costs (EUR)')
         ))
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['mer'].round(2), mode='lines', name='MER',
+        add_overlays('ad_costs', 'Ad Costs (EUR)', '#dc2626')
+        fig.add_trace(scatter(
+            **series(df_plot['mer'].round(2)), mode='lines', name='MER',
             line=dict(color='#10b981', width=2), yaxis='y2',
-            hovertemplate=('Month=%{x}<br>MER=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>MER=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('MER')
         ))
+        add_overlays('mer', 'MER', '#10b981', yaxis='y2')
         fig.update_layout(yaxis2=dict(title='MER', overlaying='y', side='right', showgrid=False))
         y_title = 'Revenue / Ad Costs (EUR)'
     elif sel == 'MER vs CM3 vs CM2':
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['cm2'], mode='lines', name='CM2 (EUR)',
+        fig.add_trace(scatter(
+            **series(df_plot['cm2']), mode='lines', name='CM2 (EUR)',
             line=dict(color='#2563eb', width=2),
-            hovertemplate=('Month=%{x}<br>CM2 (EUR)=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>CM2 (EUR)=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('CM2 (EUR)')
         ))
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['cm3'], mode='lines', name='CM3 (EUR)',
+        fig.add_trace(scatter(
+            **series(df_plot['cm3']), mode='lines', name='CM3 (EUR)',
             line=dict(color='#dc2626', width=2, dash='dash'),
-            hovertemplate=('Month=%{x}<br>CM3 (EUR)=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>CM3 (EUR)=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('CM3 (EUR)')
         ))
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['mer'].round(2), mode='lines', name='MER',
+        fig.add_trace(scatter(
+            **series(df_plot['mer'].round(2)), mode='lines', name='MER',
             line=dict(color='#10b981', width=2), yaxis='y2',
-            hovertemplate=('Month=%{x}<br>MER=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>MER=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('MER')
         ))
+        add_overlays('mer', 'MER', '#10b981', yaxis='y2')
         fig.update_layout(yaxis2=dict(title='MER', overlaying='y', side='right', showgrid=False))
         y_title = 'CM2 / CM3 (EUR)'
     elif sel == 'Revenue':
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['revenue'], mode='lines+markers', name='Revenue (EUR)',
+        fig.add_trace(scatter(
+            **series(df_plot['revenue']), mode='lines+markers', name='Revenue (EUR)',
             line=dict(color='#2563eb', width=2), marker=dict(size=4),
-            hovertemplate=('Month=%{x}<br>Revenue (EUR)=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>Revenue (EUR)=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('Revenue (EUR)')
         ))
+        add_overlays('revenue', 'Revenue (EUR)', '#2563eb')
         y_title = 'Revenue (EUR)'
     elif sel == 'Orders':
         fig.add_trace(go.Bar(
-            x=df_plot['x'], y=df_plot['orders'], name='Orders', marker_color='#10b981', opacity=0.7,
-            hovertemplate=('Month=%{x}<br>Orders=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>Orders=%{y:.2f}<extra></extra>')
+            **series(df_plot['orders']), name='Orders', marker_color='#10b981', opacity=0.7,
+            hovertemplate=hover('Orders')
         ))
         y_title = 'Orders'
     elif sel == 'CAC & ROI':
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['cac'], mode='lines', name='CAC (EUR)',
+        fig.add_trace(scatter(
+            **series(df_plot['cac']), mode='lines', name='CAC (EUR)',
             line=dict(color='#7c3aed', width=2),
-            hovertemplate=('Month=%{x}<br>CAC (EUR)=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>CAC (EUR)=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('CAC (EUR)')
         ))
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['roi'], mode='lines', name='ROI',
+        add_overlays('cac', 'CAC (EUR)', '#7c3aed')
+        fig.add_trace(scatter(
+            **series(df_plot['roi']), mode='lines', name='ROI',
             line=dict(color='#f59e0b', width=2, dash='dot'), yaxis='y2',
-            hovertemplate=('Month=%{x}<br>ROI=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>ROI=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('ROI')
         ))
         fig.update_layout(yaxis2=dict(title='ROI', overlaying='y', side='right', showgrid=False))
         y_title = 'CAC (EUR)'
     elif sel == 'Costs breakdown: Google+Meta vs Revenue':
         fig.add_trace(go.Bar(
-            x=df_plot['x'], y=(df_plot['google_costs'] + df_plot['meta_costs']), name='Ad Costs (Google+Meta)',
+            **series(df_plot['google_costs'] + df_plot['meta_costs']), name='Ad Costs (Google+Meta)',
             marker_color='#64748b', opacity=0.6,
-            hovertemplate=('Month=%{x}<br>Ad Costs (EUR)=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>Ad Costs (EUR)=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('Ad Costs (EUR)')
         ))
-        fig.add_trace(go.Scatter(
-            x=df_plot['x'], y=df_plot['revenue'], mode='lines', name='Revenue (EUR)',
+        fig.add_trace(scatter(
+            **series(df_plot['revenue']), mode='lines', name='Revenue (EUR)',
             line=dict(color='#2563eb', width=2), yaxis='y2',
-            hovertemplate=('Month=%{x}<br>Revenue (EUR)=%{y:.2f}<extra></extra>' if _is_monthly else 'Date=%{x}<br>Revenue (EUR)=%{y:.2f}<extra></extra>')
+            hovertemplate=hover('Revenue (EUR)')
         ))
+        add_overlays('revenue', 'Revenue (EUR)', '#2563eb', yaxis='y2')
         fig.update_layout(yaxis2=dict(title='Revenue (EUR)', overlaying='y', side='right', showgrid=False))
         y_title = 'Ad Costs (EUR)'
     else:
@@ -598,9 +565,235 @@ else:
         template='plotly_white', hovermode='x unified',
         legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
         margin=dict(l=10, r=10, t=10, b=10),
-        xaxis=dict(title=_x_title), yaxis=dict(title=y_title, gridcolor='rgba(0,0,0,0.05)')
+        xaxis=dict(title=x_title, type='date', tickformat=(x_format if is_monthly else None), hoverformat=x_format), yaxis=dict(title=y_title, gridcolor='rgba(0,0,0,0.05)')
     )
-    st.plotly_chart(fig, use_container_width=True)
-
+    return fig
+
+@st.fragment
+def breakdown_section(df_show: pd.DataFrame, granularity: str, ship_cost: float,
+                      shop: str, paths: list, start: pd.Timestamp, end: pd.Timestamp, version: tuple):
+    # View switch, paging and plot type rerun only this section, on the inputs of the last full run.
+    # df_show was built from `version`; once a newer one is served the whole page reruns instead.
+    if ds.data_version(paths) != version:
+        st.rerun()
+    run = _fragment_run()
+    _head = st.columns([6, 1, 0.5, 1])
+    with _head[0]:
+        st.subheader(t('breakdown'))
+    # Table/Plot switch pill: Table | [toggle] | Plot
+    with _head[1]:
+        st.markdown("<div class='pill-label right'>Table</div>", unsafe_allow_html=True)
+    with _head[2]:
+        if 'view_plot' not in st.session_state:
+            st.session_state['view_plot'] = False
+        st.markdown("<div class='pill-mid'>", unsafe_allow_html=True)
+        st.toggle("Plot view", key='view_plot', label_visibility='collapsed')
+        st.markdown("</div>", unsafe_allow_html=True)
+    with _head[3]:
+        st.markdown("<div class='pill-label left'>Plot</div>", unsafe_allow_html=True)
 
+    if not st.session_state.get('view_plot', False):
+        df_show = df_show.reset_index(drop=True)
+        # Keep numeric dtypes; 2-decimal formatting is applied per column by the grid
+        id_col = 'date' if 'date' in df_show.columns else ('year_month' if 'year_month' in df_show.columns else None)
+        _col_config = {
+            _col: st.column_config.NumberColumn(format="%.2f")
+            for _col in df_show.columns if _col != id_col
+        }
+        # Long Daily selections are sent to the browser one page at a time
+        display_df = df_show
+        _n_pages = max(1, -(-len(df_show) // TABLE_PAGE_ROWS))
+        if _n_pages > 1:
+            if st.session_state.get('table_page', 1) > _n_pages:
+                st.session_state['table_page'] = _n_pages
+            _page = int(st.number_input("Page", min_value=1, max_value=_n_pages, step=1, key='table_page'))
+            _lo = (_page - 1) * TABLE_PAGE_ROWS
+            display_df = df_show.iloc[_lo:_lo + TABLE_PAGE_ROWS]
+            st.caption(f"Rows {_lo + 1}–{_lo + len(display_df)} of {len(df_show)}")
+        _rows = min(12, len(df_show)) if len(df_show) else 12
+        _row_height = 34
+        _header_height = 38
+        _padding = 16
+        _height = _header_height + (_rows * _row_height) + _padding
+        with run.span('table') as _span:
+            st.dataframe(display_df, use_container_width=True, height=_height, hide_index=True, column_config=_col_config)
+            _span['rows'] = len(display_df)
+    else:
+        _opts = st.columns([2, 1, 1])
+        with _opts[0]:
+            sel = st.selectbox("Plot type", list(PLOT_OPTIONS), index=0, key='plot_type')
+        with _opts[1]:
+            _roll = st.selectbox(
+                "Rolling average", ["Off", "7 days", "28 days"], key='overlay_window',
+                disabled=(granularity != "Daily"), help="Daily breakdown only",
+            )
+        with _opts[2]:
+            st.markdown('<div class="row-spacer"></div>', unsafe_allow_html=True)
+            _yoy = st.checkbox("Previous year", key='overlay_yoy')
+        _window = int(_roll.split()[0]) if _roll != "Off" and granularity == "Daily" else None
+        _is_monthly = granularity == 'Monthly'
+        _x_title = 'Month' if _is_monthly else 'Date'
+        # Plots without margin columns are shared across shipping costs
+        _fig_ship = ship_cost if PLOT_OPTIONS[sel] else None
+
+        def _figure():
+            df_plot = plot_frame(df_show, granularity)
+            overlays = None
+            if _window or _yoy:
+                # Windows reach back before the selection: up to a year plus the rolling window
+                parts = ds.load_partitions(paths, start - pd.DateOffset(years=1) - pd.Timedelta(days=_window or 0), end)
+                overlays = ds.trend_overlays(parts, df_plot['x'], granularity, _window, _yoy)
+            return build_figure(df_plot, sel, _is_monthly, _x_title, overlays)
+
+        with run.span('figure') as _span:
+            fig = rc.get_or_compute(shop, version, ('fig', start, end, granularity, _fig_ship, sel, _window, _yoy), _figure)
+            _span['rows'] = len(df_show)
+        with run.span('plotly_chart'):
+            st.plotly_chart(fig, use_container_width=True)
+    # Downloads are generated on click, off the script thread
+    _stem = f"marketing_metrics_{shop}_{start:%Y%m%d}-{end:%Y%m%d}"
+    _cols = list(df_show.columns)
+
+    def _raw(fmt: str) -> bytes:
+        parts = ds.load_partitions(paths, start, end)
+        write = export.xlsx_bytes if fmt == 'xlsx' else export.csv_bytes
+        return write(export.raw_frames(parts, start, end), export.raw_columns(parts))
+
+    def _raw_meta() -> tuple[int, bool]:
+        # Raw row count (XLSX limit) and whether any partition is a streamed daily rollup
+        parts = ds.load_partitions(paths, start, end)
+        return export.raw_row_count(parts, start, end), any(part['streamed'] for part in parts)
+
+    _n_raw, _rollup = rc.get_or_compute(shop, version, ('raw_meta', start, end), _raw_meta)
+    # Inputs above DASHBOARD_STREAM_MB are kept as one summed row per day; say so on the button
+    _raw_label, _raw_stem = ("Daily rollup", "daily_rollup") if _rollup else ("Raw rows", "raw")
+    _formats = ['csv'] + (['xlsx'] if export.xlsxwriter is not None else [])
+    _dl = st.columns(2 * len(_formats))
+    for _i, _fmt in enumerate(_formats):
+        _write = export.xlsx_bytes if _fmt == 'xlsx' else export.csv_bytes
+        # An XLSX sheet holds XLSX_MAX_ROWS rows; longer downloads are offered as CSV only
+        with _dl[_i]:
+            if _fmt == 'xlsx' and not export.xlsx_fits(len(df_show)):
+                st.caption(f"Breakdown: too many rows for XLSX ({export.XLSX_MAX_ROWS - 1:,} max), use CSV")
+            else:
+                st.download_button(
+                    f"Breakdown ({_fmt.upper()})", lambda _write=_write: _write([df_show], _cols),
+                    file_name=f"{_stem}_{granularity.lower()}.{_fmt}", on_click='ignore', key=f'dl_breakdown_{_fmt}',
+                )
+        with _dl[len(_formats) + _i]:
+            if _fmt == 'xlsx' and not export.xlsx_fits(_n_raw):
+                st.caption(f"{_raw_label}: too many rows for XLSX ({export.XLSX_MAX_ROWS - 1:,} max), use CSV")
+            else:
+                st.download_button(
+                    f"{_raw_label} ({_fmt.upper()})", lambda _fmt=_fmt: _raw(_fmt),
+                    file_name=f"{_stem}_{_raw_stem}.{_fmt}", on_click='ignore', key=f'dl_raw_{_fmt}',
+                )
+    if run is not _perf:
+        run.finish(
+            fragment='breakdown', shop=shop, granularity=granularity,
+            view='plot' if st.session_state.get('view_plot', False) else 'table',
+        )
+
+breakdown_section(df_show, _granularity, _ship_cost, _shop, shop_paths, start_ts, end_ts, _version)
+
+CHANNEL_COLORS = ['#2563eb', '#dc2626', '#10b981', '#f59e0b', '#7c3aed', '#64748b', '#0ea5e9', '#db2777']
+
+@st.fragment
+def cost_drilldown(cost_path: str, granularity: str, shop: str, start: pd.Timestamp, end: pd.Timestamp, prev: tuple):
+    # Ad spend by channel and campaign from the long-format cost table; drill selections rerun only this section
+    run = _fragment_run()
+    prev_start, prev_end = prev
+    with run.span('costs') as _span:
+        _st = os.stat(cost_path)
+        cube = ds.load_cost_cube(cost_path, _st.st_mtime, _st.st_size)
+        st.divider()
+        st.subheader("Ad spend drill-down")
+        _sel = st.columns(2)
+        with _sel[0]:
+            channel = st.selectbox("Channel", ["All"] + cube['channels'], key='cost_channel')
+        channel = None if channel == "All" else channel
+        campaign = None
+        if channel is not None:
+            _campaigns = ds.cost_totals(cube, start, end, channel)
+            with _sel[1]:
+                if st.session_state.get('cost_campaign', "All") not in ("All", *_campaigns.index):
+                    st.session_state['cost_campaign'] = "All"
+                campaign = st.selectbox("Campaign", ["All"] + list(_campaigns.index), key='cost_campaign')
+            campaign = None if campaign == "All" else campaign
+
+        # Rows of the level below the selection: channels, or campaigns of the chosen channel
+        curr_tot = ds.cost_totals(cube, start, end, channel)
+        prev_tot = ds.cost_totals(cube, prev_start, prev_end, channel)
+        all_spend = float(ds.cost_totals(cube, start, end).sum())
+        if campaign is not None:
+            spend, prev_spend = float(curr_tot.get(campaign, 0.0)), float(prev_tot.get(campaign, 0.0))
+        else:
+            spend, prev_spend = float(curr_tot.sum()), float(prev_tot.sum())
+        _cards = st.columns(3)
+        with _cards[0]:
+            render_card("Spend", spend, eur, pct_change(spend, prev_spend), 'Spend of the selected channel/campaign in the range')
+        with _cards[1]:
+            render_card("Share of spend", (spend / all_spend * 100.0) if all_spend > 0 else 0.0, pct, None, 'Spend ÷ spend of all channels')
+        with _cards[2]:
+            render_card("Previous period", prev_spend, eur, None, 'Spend in the comparison range')
+
+        if campaign is None:
+            _level = 'campaign' if channel is not None else 'channel'
+            table = pd.DataFrame({
+                'spend': curr_tot,
+                'previous': prev_tot.reindex(curr_tot.index, fill_value=0.0),
+            })
+            table['change_pct'] = [pct_change(c, p) for c, p in zip(table['spend'], table['previous'])]
+            table['share_pct'] = table['spend'] / all_spend * 100.0 if all_spend > 0 else 0.0
+            table = table.reset_index().rename(columns={'index': _level})
+            st.dataframe(
+                table, use_container_width=True, hide_index=True,
+                column_config={c: st.column_config.NumberColumn(format="%.2f") for c in table.columns if c != _level},
+            )
+
+        series = ds.cost_series(cube, start, end, granularity, channel, campaign)
+        _span['rows'] = len(series)
+        _id = 'date' if granularity == "Daily" else 'year_month'
+        _x = pd.to_datetime(series[_id] + ('' if granularity == "Daily" else '-01'), format='%Y-%m-%d')
+        _x = _x.to_numpy(dtype='datetime64[ms]').astype('int64').astype('float64')
+        go = _plotly()
+        fig = go.Figure()
+        for i, name in enumerate(c for c in series.columns if c != _id):
+            fig.add_trace(go.Bar(
+                x=_x, y=series[name].to_numpy(dtype='float64'), name=str(name),
+                marker_color=CHANNEL_COLORS[i % len(CHANNEL_COLORS)],
+                hovertemplate=f"%{{x|{'%Y-%m-%d' if granularity == 'Daily' else '%b %Y'}}}<br>{name}=%{{y:.2f}}<extra></extra>",
+            ))
+        fig.update_layout(
+            template='plotly_white', barmode='stack', hovermode='x unified',
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+            margin=dict(l=10, r=10, t=10, b=10),
+            xaxis=dict(type='date', title=('Date' if granularity == "Daily" else 'Month')), yaxis=dict(title='Spend (EUR)', gridcolor='rgba(0,0,0,0.05)'),
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    if run is not _perf:
+        run.finish(fragment='costs', shop=shop, channel=channel, campaign=campaign)
+
+if _shop in cost_tables:
+    cost_drilldown(cost_tables[_shop], _granularity, _shop, start_ts, end_ts, (prev_start, prev_end))
+
+# Rendered last in the sidebar, after every load of this run: refreshes started by any of them
+# turn polling on. Polls only while a refresh is running.
+with st.sidebar:
+    st.fragment(data_status, run_every=(2 if ds.refresh_status(shop_paths)['refreshing'] else None))(shop_paths, _version)
 
+_rerun = _perf.finish(
+    shop=_shop, preset=st.session_state.get('preset'), granularity=_granularity,
+    view='plot' if st.session_state.get('view_plot', False) else 'table',
+)
+# Hidden debug panel: open the app with ?debug=1 (or set DASHBOARD_DEBUG=1)
+if st.query_params.get('debug') == '1' or os.environ.get('DASHBOARD_DEBUG') == '1':
+    with st.expander("Debug: rerun timings", expanded=False):
+        st.caption(f"Total {_rerun['total_ms']:.1f} ms · log: {perf.LOG_PATH or 'disabled'}")
+        st.dataframe(pd.DataFrame(_rerun['spans']), hide_index=True, use_container_width=True)
+        st.markdown("**Percentiles across reruns (ms)**")
+        st.dataframe(pd.DataFrame(perf.percentiles()).T, use_container_width=True)
+        st.markdown("**Result cache**")
+        st.json(rc.stats())
+        st.markdown("**Cold start of this process (ms)**")
+        st.json(perf.startup)
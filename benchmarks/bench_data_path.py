@@ -0,0 +1,167 @@
+"""Headless benchmark of the dashboard's data path.
+
+Generates synthetic marketing_metrics tables and times the same functions app.py calls
+(dataset.py), without Streamlit, a browser or the /data/in mount:
+
+    python benchmarks/bench_data_path.py --rows 1000 100000 1000000
+    python benchmarks/bench_data_path.py --rows 10000000 --variants daily --json
+    python benchmarks/bench_data_path.py --rows 10000000 --variants daily --stream
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset as ds  # noqa: E402
+
+# Rows per table beyond this many days share dates (campaign/channel-level exports)
+MAX_DAYS = 3650
+
+VARIANTS = {
+    # name: (other_costs column, date column; False means the year_month schema)
+    'daily': (False, True),
+    'daily_other': (True, True),
+    'year_month': (False, False),
+}
+
+
+def make_table(rows: int, other_costs: bool = False, date_column: bool = True, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = min(rows, MAX_DAYS)
+    end = pd.Timestamp.today().normalize()
+    offsets = (np.arange(rows, dtype='int64') * days) // rows
+    dates = end - pd.to_timedelta(days - 1 - offsets, unit='D')
+    orders = rng.integers(0, 80, rows)
+    revenue = np.round(orders * rng.uniform(30, 90, rows), 2)
+    google = np.round(rng.uniform(0, 300, rows), 2)
+    meta = np.round(rng.uniform(0, 250, rows), 2)
+    df = pd.DataFrame()
+    if date_column:
+        df['date'] = dates.strftime('%Y-%m-%d')
+    else:
+        df['year_month'] = dates.strftime('%Y-%m')
+    df['orders'] = orders
+    df['google_costs'] = google
+    df['meta_costs'] = meta
+    ad_costs = google + meta
+    if other_costs:
+        df['other_costs'] = np.round(rng.uniform(0, 50, rows), 2)
+        ad_costs = ad_costs + df['other_costs'].to_numpy()
+    df['ad_costs'] = np.round(ad_costs, 2)
+    df['revenue'] = revenue
+    df['cost_of_goods_sold'] = np.round(revenue * 0.55, 2)
+    return df
+
+
+def _timed(fn, repeat: int = 1) -> tuple[float, object]:
+    # Median wall time in milliseconds and the last result
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(times), result
+
+
+def _cold_load(path: str) -> tuple[float, float, dict]:
+    # Wall time (ms) and traced peak memory (MB) of one load with no in-process state
+    ds.reset_registry()
+    st = os.stat(path)
+    tracemalloc.start()
+    ms, data = _timed(lambda: ds.load_dataset(path, st.st_mtime, st.st_size))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ms, peak / 1e6, data
+
+
+def _selection(data: dict, preset: str, granularity: str, today) -> tuple[pd.Timestamp, pd.Timestamp]:
+    # Mirrors the sidebar: preset range, expanded to whole months in Monthly mode
+    min_date = data['df']['period_date'].iloc[0].date()
+    s, e = ds.preset_calendar(today, min_date, today)['selection'][granularity][preset]
+    return pd.Timestamp(s), pd.Timestamp(e)
+
+
+def rerun(data: dict, preset: str, granularity: str, today, ship_cost: float = 2.5) -> pd.DataFrame:
+    # Data work of one dashboard rerun: both KPI rows and the breakdown table
+    start, end = _selection(data, preset, granularity, today)
+    ds.compute_metrics(ds.range_totals(data['cumsums'], start, end), ship_cost)
+    calendar = ds.preset_calendar(today, data['df']['period_date'].iloc[0].date(), today)
+    prev_start, prev_end = ds.prev_range(calendar, start, end, preset, granularity)
+    ds.compute_metrics(ds.range_totals(data['cumsums'], prev_start, prev_end), ship_cost)
+    return ds.build_breakdown(data, start, end, granularity, ship_cost)
+
+
+def bench_table(rows: int, variant: str, workdir: str, repeat: int) -> dict:
+    other_costs, date_column = VARIANTS[variant]
+    path = os.path.join(workdir, f'marketing_metrics_{variant}_{rows}.csv')
+    make_table(rows, other_costs, date_column).to_csv(path, index=False)
+    sidecar = ds._sidecar_path(path)
+    if os.path.exists(sidecar):
+        os.remove(sidecar)
+
+    result = {'rows': rows, 'variant': variant, 'csv_mb': round(os.path.getsize(path) / 1e6, 2)}
+    result['cold_csv_ms'], result['cold_csv_peak_mb'], _ = _cold_load(path)
+    result['cold_sidecar_ms'], result['cold_sidecar_peak_mb'], data = _cold_load(path)
+
+    today = data['df']['period_date'].iloc[-1].date()
+    result['warm_rerun_ms'], _ = _timed(lambda: rerun(data, 'Last month', 'Monthly', today), repeat)
+
+    def _switch_presets():
+        for preset in ds.PRESETS[1:]:
+            for granularity in ('Monthly', 'Daily'):
+                rerun(data, preset, granularity, today)
+
+    switches = (len(ds.PRESETS) - 1) * 2
+    ms, _ = _timed(_switch_presets, repeat)
+    result['preset_switch_ms'] = ms / switches
+
+    first, last = data['df']['period_date'].iloc[0], data['df']['period_date'].iloc[-1]
+    for granularity in ('Daily', 'Monthly'):
+        ms, _ = _timed(lambda: ds.build_breakdown(data, first, last, granularity, 2.5), repeat)
+        result[f'breakdown_{granularity.lower()}_full_ms'] = ms
+
+    os.remove(path)
+    if os.path.exists(sidecar):
+        os.remove(sidecar)
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--variants', nargs='+', choices=sorted(VARIANTS), default=sorted(VARIANTS))
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions for warm timings (median is reported)')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per table instead of a table')
+    parser.add_argument('--stream', action='store_true', help='ingest every table in chunks, as inputs above DASHBOARD_STREAM_MB are')
+    args = parser.parse_args(argv)
+    if args.stream:
+        ds.STREAM_THRESHOLD_BYTES = 0
+
+    with tempfile.TemporaryDirectory(prefix='mm-bench-') as workdir:
+        for rows in args.rows:
+            for variant in args.variants:
+                res = bench_table(rows, variant, workdir, args.repeat)
+                if args.json:
+                    print(json.dumps(res))
+                else:
+                    print(
+                        f"{res['rows']:>10,} {res['variant']:<12} csv {res['csv_mb']:>8.2f} MB | "
+                        f"cold csv {res['cold_csv_ms']:>9.1f} ms ({res['cold_csv_peak_mb']:.0f} MB peak) | "
+                        f"cold sidecar {res['cold_sidecar_ms']:>8.1f} ms | "
+                        f"rerun {res['warm_rerun_ms']:>7.2f} ms | preset {res['preset_switch_ms']:>7.2f} ms | "
+                        f"daily {res['breakdown_daily_full_ms']:>8.1f} ms | monthly {res['breakdown_monthly_full_ms']:>6.2f} ms"
+                    )
+                sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
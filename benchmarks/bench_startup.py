@@ -0,0 +1,89 @@
+"""Cold-start benchmark of the dashboard: imports and first render in a fresh process.
+
+Each repeat starts a new Python process, points app.py at a synthetic table through
+DASHBOARD_TABLES_DIR and renders it headless with Streamlit's AppTest:
+
+    python benchmarks/bench_startup.py --rows 100000 --repeat 5
+    python benchmarks/bench_startup.py --budget-ms 2500   # exit status 1 when over budget
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_data_path import make_table  # noqa: E402
+
+# Runs in the fresh process; prints one JSON object
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import streamlit
+streamlit_ms = (time.perf_counter() - t0) * 1000.0
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+t1 = time.perf_counter()
+at.run()
+first_run_ms = (time.perf_counter() - t1) * 1000.0
+assert not at.exception, at.exception
+startup = dict(sys.modules['perf'].startup)
+t2 = time.perf_counter()
+at.toggle(key='view_plot').set_value(True).run()
+plot_view_ms = (time.perf_counter() - t2) * 1000.0
+assert not at.exception, at.exception
+print(json.dumps({
+    'streamlit_import_ms': streamlit_ms,
+    'app_imports_ms': startup['imports_ms'],
+    'first_render_ms': startup['first_render_ms'],
+    'first_run_wall_ms': first_run_ms,
+    'plot_view_ms': plot_view_ms,
+}))
+'''
+
+FIELDS = ['streamlit_import_ms', 'app_imports_ms', 'first_render_ms', 'first_run_wall_ms', 'plot_view_ms']
+
+
+def run_once(rows: int) -> dict:
+    # One cold process over a fresh tables dir (no Parquet sidecar yet, like a new container)
+    with tempfile.TemporaryDirectory(prefix='mm-startup-') as tables_dir:
+        make_table(rows).to_csv(os.path.join(tables_dir, 'marketing_metrics.csv'), index=False)
+        env = dict(os.environ, DASHBOARD_TABLES_DIR=tables_dir, DASHBOARD_PERF_LOG='')
+        out = subprocess.run(
+            [sys.executable, '-c', CHILD, os.path.join(ROOT, 'app.py')],
+            env=env, cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3, help='fresh processes to start (median is reported)')
+    parser.add_argument('--budget-ms', type=float, default=None, help='fail when the median first render exceeds this')
+    parser.add_argument('--json', action='store_true', help='print the medians as one JSON object')
+    args = parser.parse_args(argv)
+
+    runs = [run_once(args.rows) for _ in range(args.repeat)]
+    result = {'rows': args.rows, 'repeat': args.repeat}
+    result.update({f: statistics.median(r[f] for r in runs) for f in FIELDS})
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(
+            f"{args.rows:>10,} rows | import streamlit {result['streamlit_import_ms']:>7.1f} ms | "
+            f"app imports {result['app_imports_ms']:>7.1f} ms | first render {result['first_render_ms']:>7.1f} ms | "
+            f"first run (wall) {result['first_run_wall_ms']:>7.1f} ms | plot view {result['plot_view_ms']:>7.1f} ms"
+        )
+    if args.budget_ms is not None and result['first_render_ms'] > args.budget_ms:
+        print(f"first render {result['first_render_ms']:.1f} ms exceeds budget {args.budget_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
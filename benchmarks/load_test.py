@@ -0,0 +1,195 @@
+"""Concurrent multi-session load test of the dashboard.
+
+Drives app.py through Streamlit's AppTest from N threads at once, in one process like a real
+server, so sessions share the data registry and result cache. Each session performs a random
+but realistic interaction sequence (preset changes, Daily/Monthly switches, shipping-cost
+edits, Table/Plot toggles and plot-type changes) against a synthetic marketing_metrics.csv:
+
+    python benchmarks/load_test.py --sessions 1 2 4 8 16 --steps 20
+    python benchmarks/load_test.py --sessions 8 --rows 1000000 --json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_data_path import make_table  # noqa: E402
+import dataset as ds  # noqa: E402
+import perf  # noqa: E402
+
+APP = os.path.join(ROOT, 'app.py')
+PLOT_TYPES = [
+    "Ad Costs vs Revenue vs MER",
+    "MER vs CM3 vs CM2",
+    "Revenue",
+    "Orders",
+    "CAC & ROI",
+    "Costs breakdown: Google+Meta vs Revenue",
+]
+# Relative frequency of each interaction
+ACTIONS = {'preset': 4, 'granularity': 2, 'shipping': 2, 'view': 1, 'plot_type': 2}
+
+
+def _interact(at, action: str, rng: random.Random) -> None:
+    # Apply one interaction and rerun; widgets missing in the current view are brought up first
+    if action == 'preset':
+        at.selectbox(key='preset').set_value(rng.choice(ds.PRESETS[1:]))
+    elif action == 'granularity':
+        current = at.selectbox(key='granularity').value
+        at.selectbox(key='granularity').set_value('Daily' if current == 'Monthly' else 'Monthly')
+    elif action == 'shipping':
+        at.number_input(key='shipping_cost').set_value(round(rng.uniform(0, 6), 1))
+    elif action == 'view':
+        at.toggle(key='view_plot').set_value(not at.toggle(key='view_plot').value)
+    elif action == 'plot_type':
+        if not at.toggle(key='view_plot').value:
+            at.toggle(key='view_plot').set_value(True).run()
+        at.selectbox(key='plot_type').set_value(rng.choice(PLOT_TYPES))
+    at.run()
+
+
+def _share_apptest_state() -> None:
+    # AppTest is built for one session at a time. Two of its per-run globals would break
+    # concurrent sessions, so make them process-wide as they are in a real server:
+    # - it compiles app.py into a new ScriptCache on every run, which recompiles on every rerun
+    #   and, with threads, hits a CPython 3.11 ast.parse race; one shared cache compiles once
+    # - it installs a mock Runtime per run and clears it afterwards, pulling it from under other
+    #   sessions' scripts; the last installed runtime stays available instead
+    import streamlit.testing.v1.app_test as app_test
+    import streamlit.testing.v1.local_script_runner as local_script_runner
+    from streamlit.runtime.runtime import Runtime
+
+    shared = app_test.ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared
+
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if last:
+            return last[0]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(last))
+
+
+def session(seed: int, steps: int, barrier: threading.Barrier, latencies: list, errors: list) -> None:
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    names, weights = list(ACTIONS), list(ACTIONS.values())
+    try:
+        at = AppTest.from_file(APP, default_timeout=120)
+        barrier.wait()
+        t0 = time.perf_counter()
+        at.run()
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        for _ in range(steps):
+            action = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            _interact(at, action, rng)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            if at.exception:
+                errors.append(f"{action}: {at.exception[0].message}")
+                return
+    except Exception as exc:
+        errors.append(f"{type(exc).__name__}: {exc}")
+        barrier.abort()
+
+
+class _RssSampler(threading.Thread):
+    # Peak process RSS while a load level runs
+    def __init__(self, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = perf._rss_bytes() or 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, perf._rss_bytes() or 0)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+def run_level(n: int, steps: int, seed: int) -> dict:
+    latencies, errors = [], []
+    barrier = threading.Barrier(n)
+    threads = [
+        threading.Thread(target=session, args=(seed + i, steps, barrier, latencies, errors), name=f"session-{i}")
+        for i in range(n)
+    ]
+    sampler = _RssSampler()
+    sampler.start()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    peak = sampler.stop()
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'sessions': n,
+        'reruns': len(latencies),
+        'errors': errors,
+        'wall_s': wall,
+        'throughput_rps': len(latencies) / wall if wall > 0 else 0.0,
+        'p50_ms': float(np.percentile(lat, 50)),
+        'p95_ms': float(np.percentile(lat, 95)),
+        'p99_ms': float(np.percentile(lat, 99)),
+        'rss_mb': (perf._rss_bytes() or 0) / 1e6,
+        'peak_rss_mb': peak / 1e6,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--steps', type=int, default=20, help='interactions per session after its first render')
+    parser.add_argument('--rows', type=int, default=100_000, help='rows of the synthetic marketing_metrics.csv')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print one JSON object per load level')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='mm-load-') as tables_dir:
+        make_table(args.rows).to_csv(os.path.join(tables_dir, 'marketing_metrics.csv'), index=False)
+        os.environ['DASHBOARD_TABLES_DIR'] = tables_dir
+        os.environ['DASHBOARD_PERF_LOG'] = ''
+        _share_apptest_state()
+        # Warm-up: the first render parses the CSV; levels below measure steady-state reruns
+        run_level(1, 0, args.seed)
+        failed = False
+        for n in args.sessions:
+            res = run_level(n, args.steps, args.seed)
+            failed = failed or bool(res['errors'])
+            if args.json:
+                print(json.dumps(res))
+            else:
+                print(
+                    f"{n:>4} sessions | {res['reruns']:>5} reruns in {res['wall_s']:>6.1f} s "
+                    f"({res['throughput_rps']:>6.1f}/s) | p50 {res['p50_ms']:>7.1f} ms | p95 {res['p95_ms']:>7.1f} ms | "
+                    f"p99 {res['p99_ms']:>7.1f} ms | rss {res['rss_mb']:>6.0f} MB (peak {res['peak_rss_mb']:.0f})"
+                    + (f" | {len(res['errors'])} errors: {res['errors'][0]}" if res['errors'] else '')
+                )
+            sys.stdout.flush()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
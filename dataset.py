@@ -0,0 +1,892 @@
+"""Data path of the marketing dashboard: loading, range lookups, aggregation and KPI math.
+
+Importable without Streamlit so the same code can be benchmarked headless (see benchmarks/).
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet sidecar is optional; without pyarrow we always parse the CSV
+    pa = pq = None
+
+# Additive base columns the dashboard reads; margins and ratios are derived from these, and
+# precomputed cm2/cm3/cac/mer/roi/aov columns of older exports are not read
+METRIC_COLUMNS = [
+    'orders', 'google_costs', 'meta_costs', 'other_costs', 'ad_costs', 'revenue', 'cost_of_goods_sold',
+]
+# Count-like columns stored as int32; money stays float64 so sums keep cent precision
+INT_COLUMNS = ['orders']
+# Source date labels; parsed into period_date and not kept in the loaded frame
+LABEL_COLUMNS = ('date', 'year_month')
+# Bump when the stored layout changes so sidecars written by older code are rebuilt
+SIDECAR_VERSION = '6'
+
+
+def _sidecar_path(path: str) -> str:
+    # Prefer next to the input; fall back to the temp dir when the mount is read-only
+    stem = os.path.splitext(os.path.basename(path))[0]
+    folder = os.path.dirname(path)
+    if not os.access(folder, os.W_OK):
+        # Partitions of different shops share file names (2024.csv), so qualify by the full path
+        stem += '-' + hashlib.blake2b(os.path.abspath(path).encode(), digest_size=6).hexdigest()
+        folder = tempfile.gettempdir()
+    return os.path.join(folder, stem + '.parquet')
+
+
+# Inputs larger than this are ingested in chunks into a daily rollup instead of read whole
+STREAM_THRESHOLD_BYTES = int(float(os.environ.get('DASHBOARD_STREAM_MB', '256')) * 1e6)
+# Rows parsed per chunk in streaming mode; bounds peak memory together with the rollup size
+STREAM_CHUNK_ROWS = int(os.environ.get('DASHBOARD_STREAM_CHUNK_ROWS', '250000'))
+
+
+def _read_csv(source) -> pd.DataFrame:
+    return _normalize(pd.read_csv(source, usecols=lambda c: c in METRIC_COLUMNS or c in LABEL_COLUMNS))
+
+
+def source_label(path: str) -> str:
+    # Date label column of an input file: 'date' (daily rows) or 'year_month'
+    return 'date' if 'date' in pd.read_csv(path, nrows=0).columns else 'year_month'
+
+
+def _rollup_chunk(chunk: pd.DataFrame, label: str) -> pd.DataFrame:
+    # Additive totals per day (per month for the year_month schema), indexed by period_date
+    if 'cost_of_goods_sold' not in chunk.columns:
+        chunk['cost_of_goods_sold'] = 0.0
+    if 'ad_costs' not in chunk.columns:
+        chunk['ad_costs'] = chunk['google_costs'] + chunk['meta_costs'] + (chunk['other_costs'] if 'other_costs' in chunk.columns else 0)
+    if label == 'date':
+        period = pd.to_datetime(chunk['date'], errors='coerce').dt.normalize()
+    else:
+        period = pd.to_datetime(chunk['year_month'].astype(str) + '-01', errors='coerce')
+    cols = [c for c in METRIC_COLUMNS if c in chunk.columns]
+    return chunk[cols].groupby(period.to_numpy(), sort=True).sum()
+
+
+def _read_csv_streamed(path: str) -> pd.DataFrame:
+    # Order-line or campaign-level exports folded chunk by chunk into one row per day, so peak
+    # memory is one chunk plus the rollup whatever the file size. Same schema as _read_csv.
+    header = pd.read_csv(path, nrows=0).columns
+    label = source_label(path)
+    usecols = [label] + [c for c in METRIC_COLUMNS if c in header]
+    rollup = None
+    with pd.read_csv(path, usecols=usecols, chunksize=STREAM_CHUNK_ROWS) as reader:
+        for chunk in reader:
+            part = _rollup_chunk(chunk, label)
+            rollup = part if rollup is None else pd.concat([rollup, part]).groupby(level=0, sort=True).sum()
+    if rollup is None:
+        return _normalize(pd.DataFrame(columns=usecols))
+    df = rollup.reset_index(drop=True)
+    df.insert(0, label, rollup.index.strftime('%Y-%m-%d' if label == 'date' else '%Y-%m'))
+    return _normalize(df)
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    if 'cost_of_goods_sold' not in df.columns:
+        df['cost_of_goods_sold'] = 0.0
+    # Ad costs are defined once here; every downstream total reads this column
+    if 'ad_costs' not in df.columns:
+        df['ad_costs'] = df['google_costs'] + df['meta_costs'] + (df['other_costs'] if 'other_costs' in df.columns else 0)
+
+    # Normalize schema to have period_date; times of day are dropped, as in the streamed rollup
+    if 'date' in df.columns:
+        df['period_date'] = pd.to_datetime(df['date'], errors='coerce').dt.normalize()
+    else:
+        df['period_date'] = pd.to_datetime(df['year_month'].astype(str) + '-01', errors='coerce')
+
+    # Rows without a parseable date never match a range; sort once so ranges are contiguous slices.
+    # The source label is dropped: labels are formatted from period_date for the rows displayed.
+    df = df.drop(columns=[c for c in LABEL_COLUMNS if c in df.columns])
+    df = df.dropna(subset=['period_date']).sort_values('period_date', kind='stable').reset_index(drop=True)
+
+    # Typed schema: int32 counts
+    for col in INT_COLUMNS:
+        if col in df.columns and df[col].notna().all() and (df[col] % 1 == 0).all():
+            df[col] = df[col].astype('int32')
+    return df
+
+
+def _read_sidecar(sidecar: str, mtime: float, size: int) -> tuple[pd.DataFrame, str | None] | None:
+    # (frame, source digest) when the sidecar matches this file version, else None
+    if pq is None or not os.path.exists(sidecar):
+        return None
+    try:
+        schema = pq.read_schema(sidecar)
+        meta = schema.metadata or {}
+        if (
+            meta.get(b'sidecar_version') != SIDECAR_VERSION.encode()
+            or meta.get(b'source_mtime') != repr(mtime).encode()
+            or meta.get(b'source_size') != str(size).encode()
+        ):
+            return None
+        wanted = [c for c in schema.names if c in METRIC_COLUMNS or c == 'period_date']
+        digest = meta.get(b'source_digest')
+        return (
+            pq.read_table(sidecar, columns=wanted, memory_map=True).to_pandas(),
+            digest.decode() if digest else None,
+        )
+    except Exception:
+        return None
+
+
+def _write_sidecar(df: pd.DataFrame, sidecar: str, mtime: float, size: int, digest: str | None) -> None:
+    if pq is None:
+        return
+    tmp = None
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta[b'sidecar_version'] = SIDECAR_VERSION.encode()
+        meta[b'source_mtime'] = repr(mtime).encode()
+        meta[b'source_size'] = str(size).encode()
+        if digest is not None:
+            meta[b'source_digest'] = digest.encode()
+        # Unique temp name: request threads and background writers may target the same sidecar
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(sidecar) + '.', suffix='.tmp', dir=os.path.dirname(sidecar))
+        os.close(fd)
+        pq.write_table(table.replace_schema_metadata(meta), tmp)
+        os.replace(tmp, sidecar)
+    except Exception:
+        # The sidecar is only a cold-start optimization; never fail the page over it
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _load_frame(path: str, mtime: float, size: int) -> tuple[pd.DataFrame, str | None]:
+    # Frame of one file version and the digest of its bytes for append checks. The digest is
+    # stored in the sidecar, so cold starts from it never read the CSV; streamed inputs get
+    # none because they are always re-folded from scratch.
+    sidecar = _sidecar_path(path)
+    cached = _read_sidecar(sidecar, mtime, size)
+    if cached is not None:
+        return cached
+    if size > STREAM_THRESHOLD_BYTES:
+        df, digest = _read_csv_streamed(path), None
+    else:
+        df, digest = _read_csv(path), _hash_prefix(path, size).hexdigest()
+    _write_sidecar(df, sidecar, mtime, size, digest)
+    return df, digest
+
+
+def _hash_prefix(path: str, size: int):
+    # Streaming digest of the first `size` bytes; callers may keep updating it with newer bytes
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        remaining = size
+        while remaining > 0:
+            chunk = fh.read(min(1 << 20, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+def _append_tail(prev: dict, path: str, mtime: float, size: int) -> dict | None:
+    # Extend the previous version when the file only grew: old bytes unchanged, new rows not older
+    # than the last known date. Returns None whenever a full reload is needed instead.
+    if prev['digest'] is None:
+        return None
+    old_size = prev['size']
+    digest = _hash_prefix(path, old_size)
+    if digest.hexdigest() != prev['digest']:
+        return None
+    with open(path, 'rb') as fh:
+        header = fh.readline()
+        fh.seek(old_size - 1)
+        if fh.read(1) != b'\n':
+            return None
+        tail_bytes = fh.read(size - old_size)
+    if len(tail_bytes) != size - old_size:
+        return None
+    digest.update(tail_bytes)
+    try:
+        tail = _read_csv(io.BytesIO(header + tail_bytes))
+    except Exception:
+        return None
+    old = prev['df']
+    if list(tail.columns) != list(old.columns):
+        return None
+    if len(tail) and len(old) and tail['period_date'].iloc[0] < old['period_date'].iloc[-1]:
+        return None
+
+    df = pd.concat([old, tail], ignore_index=True)
+    # Refresh the Parquet sidecar off the request path; it only matters for the next cold start
+    threading.Thread(
+        target=_write_sidecar, args=(df, _sidecar_path(path), mtime, size, digest.hexdigest()), daemon=True,
+    ).start()
+    return {
+        'df': df,
+        'cumsums': extend_cumsums(prev['cumsums'], tail),
+        'monthly': extend_monthly_rollup(prev['monthly'], df, tail),
+        'mtime': mtime,
+        'size': size,
+        'digest': digest.hexdigest(),
+        'label': prev['label'],
+        'streamed': False,
+    }
+
+
+# Loaded datasets per input path in least-recently-used order. Doubles as the previous-version
+# lookup for incremental appends and is kept under CACHE_BUDGET_BYTES by evicting old entries.
+CACHE_BUDGET_BYTES = int(float(os.environ.get('DASHBOARD_CACHE_MB', '1024')) * 1e6)
+_registry: OrderedDict = OrderedDict()
+_registry_lock = threading.Lock()
+_path_locks: dict = {}
+
+
+def _dataset_nbytes(data: dict) -> int:
+    return int(
+        data['df'].memory_usage(deep=True).sum()
+        + data['monthly'].memory_usage(deep=True).sum()
+        + sum(arr.nbytes for arr in data['cumsums'].values())
+    )
+
+
+def _store(path: str, data: dict) -> None:
+    with _registry_lock:
+        _registry[path] = data
+        _registry.move_to_end(path)
+        total = sum(d['nbytes'] for d in _registry.values())
+        # The entry just stored always stays, even if it alone exceeds the budget
+        while total > CACHE_BUDGET_BYTES and len(_registry) > 1:
+            _, evicted = _registry.popitem(last=False)
+            total -= evicted['nbytes']
+
+
+def load_dataset(path: str, mtime: float, size: int) -> dict:
+    # Frame, prefix sums and monthly rollup for one file version; callers must treat them as read-only
+    with _registry_lock:
+        path_lock = _path_locks.setdefault(path, threading.Lock())
+    with path_lock:
+        with _registry_lock:
+            prev = _registry.get(path)
+            if prev is not None and prev['mtime'] == mtime and prev['size'] == size:
+                _registry.move_to_end(path)
+                return prev
+        data = None
+        # Streamed inputs are re-folded from scratch: their rows are a rollup, not the file's lines
+        if prev is not None and prev['size'] < size <= STREAM_THRESHOLD_BYTES:
+            data = _append_tail(prev, path, mtime, size)
+        if data is None:
+            df, digest = _load_frame(path, mtime, size)
+            data = {
+                'df': df,
+                'cumsums': build_cumsums(df),
+                'monthly': build_monthly_rollup(df),
+                'mtime': mtime,
+                'size': size,
+                'digest': digest,
+                'label': source_label(path),
+                # Rows are the daily rollup of the file, not its lines (see _read_csv_streamed)
+                'streamed': size > STREAM_THRESHOLD_BYTES,
+            }
+        data['nbytes'] = _dataset_nbytes(data)
+        data['loaded_at'] = time.time()
+        _store(path, data)
+        return data
+
+
+def reset_registry() -> None:
+    # Forget previously loaded versions (benchmarks use this to measure cold loads)
+    with _registry_lock:
+        _registry.clear()
+    _refresh_errors.clear()
+
+
+def discover_shops(tables_dir: str) -> dict:
+    # {shop: [partition csv paths]} from tables_dir/marketing_metrics/<shop>.csv or
+    # tables_dir/marketing_metrics/<shop>/<year>.csv; a lone marketing_metrics.csv is shop 'default'
+    shops = {}
+    root = os.path.join(tables_dir, 'marketing_metrics')
+    if os.path.isdir(root):
+        for entry in sorted(os.listdir(root)):
+            full = os.path.join(root, entry)
+            if os.path.isdir(full):
+                parts = sorted(os.path.join(full, f) for f in os.listdir(full) if f.endswith('.csv'))
+                if parts:
+                    shops[entry] = parts
+            elif entry.endswith('.csv'):
+                shops[entry[:-len('.csv')]] = [full]
+    single = os.path.join(tables_dir, 'marketing_metrics.csv')
+    if not shops and os.path.exists(single):
+        shops['default'] = [single]
+    return shops
+
+
+def data_version(paths: list[str]) -> tuple:
+    # Version of the data being served: a partition's loaded version while a newer file is still
+    # being refreshed in the background, its file on disk otherwise
+    version = []
+    for path in paths:
+        with _registry_lock:
+            served = _registry.get(path)
+        if served is not None:
+            version.append((path, served['mtime'], served['size']))
+        else:
+            st = os.stat(path)
+            version.append((path, st.st_mtime, st.st_size))
+    return tuple(version)
+
+
+# Paths with a background refresh in flight, and the last failed refresh per path:
+# {path: ((mtime, size), message)}
+_refreshing: set = set()
+_refresh_errors: dict = {}
+
+
+def _refresh(path: str, mtime: float, size: int) -> None:
+    try:
+        load_dataset(path, mtime, size)
+        _refresh_errors.pop(path, None)
+    except Exception as exc:
+        # Keep serving the previous version; this file version is not retried until it changes
+        _refresh_errors[path] = ((mtime, size), f"{type(exc).__name__}: {exc}")
+    finally:
+        with _registry_lock:
+            _refreshing.discard(path)
+
+
+def _start_refresh(path: str, mtime: float, size: int) -> None:
+    with _registry_lock:
+        if path in _refreshing:
+            return
+        _refreshing.add(path)
+    threading.Thread(target=_refresh, args=(path, mtime, size), name=f"refresh:{path}", daemon=True).start()
+
+
+def refresh_status(paths: list[str]) -> dict:
+    # Background refresh state of a shop's partitions for the sidebar
+    with _registry_lock:
+        loaded = [_registry[p]['loaded_at'] for p in paths if p in _registry]
+        refreshing = any(p in _refreshing for p in paths)
+    errors = [_refresh_errors[p][1] for p in paths if p in _refresh_errors]
+    return {
+        'refreshing': refreshing,
+        'refreshed_at': max(loaded) if loaded else None,
+        'error': errors[0] if errors else None,
+    }
+
+
+def _partition_year(path: str) -> int | None:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return int(stem) if len(stem) == 4 and stem.isdigit() else None
+
+
+def _check_changed(path: str, prev: dict | None) -> tuple[bool, tuple]:
+    # (stale, disk version): whether the served version is older than the file, starting its
+    # background refresh unless that file version already failed
+    st = os.stat(path)
+    version = (st.st_mtime, st.st_size)
+    stale = prev is not None and (prev['mtime'], prev['size']) != version
+    if stale:
+        failed = _refresh_errors.get(path)
+        if failed is None or failed[0] != version:
+            _start_refresh(path, *version)
+    return stale, version
+
+
+def poll_updates(paths: list[str]) -> None:
+    # Start refreshes for every loaded partition whose file changed, including partitions no
+    # query of this rerun reads (cached results would otherwise hide the change)
+    for path in paths:
+        with _registry_lock:
+            prev = _registry.get(path)
+        if prev is not None:
+            _check_changed(path, prev)
+
+
+def _load_path(path: str) -> dict:
+    # A new file version is built in a background thread and swapped into the registry when
+    # complete; until then the previous version keeps being served
+    with _registry_lock:
+        prev = _registry.get(path)
+    stale, version = _check_changed(path, prev)
+    if stale:
+        return prev
+    return load_dataset(path, *version)
+
+
+def load_partitions(paths: list[str], start: pd.Timestamp, end: pd.Timestamp) -> list[dict]:
+    # Only partitions whose year overlaps start..end are read; unnamed partitions always are
+    return [
+        _load_path(path) for path in paths
+        if _partition_year(path) is None or pd.Timestamp(start).year <= _partition_year(path) <= pd.Timestamp(end).year
+    ]
+
+
+def shop_bounds(paths: list[str]) -> tuple:
+    # (first, last) data date of a shop. Reads unnamed partitions and the newest year only;
+    # older year partitions stand in with 1 January of their year.
+    years = [_partition_year(path) for path in paths]
+    dated = [y for y in years if y is not None]
+    newest = max(dated) if dated else None
+    firsts, lasts = [], []
+    for path, year in zip(paths, years):
+        if year is None or year == newest:
+            dates = _load_path(path)['df']['period_date']
+            if len(dates):
+                firsts.append(dates.iloc[0])
+                lasts.append(dates.iloc[-1])
+    if dated and min(dated) < newest:
+        firsts.append(pd.Timestamp(min(dated), 1, 1))
+    return min(firsts).date(), max(lasts).date()
+
+
+def _range_bounds(dates, start: pd.Timestamp, end: pd.Timestamp) -> tuple[int, int]:
+    # Binary search on a sorted date array; [lo, hi) covers start..end inclusive
+    lo = int(dates.searchsorted(np.datetime64(pd.Timestamp(start)), side='left'))
+    hi = int(dates.searchsorted(np.datetime64(pd.Timestamp(end)), side='right'))
+    return lo, max(lo, hi)
+
+
+def slice_range(df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    # Positional slice of the sorted frame instead of a masked copy
+    lo, hi = _range_bounds(df['period_date'].to_numpy(), start, end)
+    return df.iloc[lo:hi]
+
+
+# Columns with running totals for KPI lookups
+ADDITIVE_COLUMNS = ['orders', 'revenue', 'cost_of_goods_sold', 'google_costs', 'meta_costs', 'ad_costs']
+
+
+def build_cumsums(df: pd.DataFrame) -> dict:
+    # Running totals with a leading zero, so any range total is cum[hi] - cum[lo]
+    cube = {'period_date': df['period_date'].to_numpy()}
+    for name in ADDITIVE_COLUMNS:
+        values = df[name] if name in df.columns else pd.Series(0.0, index=df.index)
+        # NaNs count as zero, matching Series.sum()
+        arr = np.nan_to_num(values.to_numpy(dtype='float64', na_value=np.nan))
+        cube[name] = np.concatenate(([0.0], np.cumsum(arr)))
+    return cube
+
+
+def extend_cumsums(cube: dict, tail: pd.DataFrame) -> dict:
+    # Continue each running total from its last value over the appended rows
+    ext = build_cumsums(tail)
+    out = {'period_date': np.concatenate([cube['period_date'], ext['period_date']])}
+    for name, cum in cube.items():
+        if name != 'period_date':
+            out[name] = np.concatenate([cum, cum[-1] + ext[name][1:]])
+    return out
+
+
+def _safe_div(num, den) -> np.ndarray:
+    # Element-wise num / den, 0.0 where den <= 0
+    num = np.asarray(num, dtype='float64')
+    den = np.asarray(den, dtype='float64')
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+
+def _derived_columns(base, ship_cost: float) -> dict:
+    # Margins and ratios from additive totals; base is a frame, a rollup slice or a dict of scalars
+    # Include shipping cost per order into CM2
+    cm2 = base['revenue'] - base['cost_of_goods_sold'] - (ship_cost * base['orders'])
+    cm3 = cm2 - base['ad_costs']
+    return {
+        'cm2': cm2,
+        'cm3': cm3,
+        'cac': _safe_div(base['ad_costs'], base['orders']),
+        'mer': _safe_div(base['revenue'], base['ad_costs']),
+        'roi': _safe_div(cm3, base['ad_costs']),
+        'aov': _safe_div(base['revenue'], base['orders']),
+    }
+
+
+def derive_metrics(base: pd.DataFrame, ship_cost: float) -> pd.DataFrame:
+    # Same formulas at any granularity (daily rows, monthly rollup); returns a new frame
+    return base.assign(**_derived_columns(base, ship_cost))
+
+
+# Breakdown columns that depend on the shipping cost input
+SHIPPING_COLUMNS = ['cm2', 'cm3', 'roi']
+
+
+def apply_shipping(table: pd.DataFrame, ship_cost: float) -> pd.DataFrame:
+    # Breakdown/rollup rows with CM2, CM3 and ROI recomputed for ship_cost; returns a new frame
+    derived = _derived_columns(table, ship_cost)
+    return table.assign(**{c: derived[c] for c in SHIPPING_COLUMNS})
+
+
+def build_monthly_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    # One row per month with additive totals; shipping-dependent columns are derived per session
+    dates = df['period_date']
+    month_key = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+    agg = df[[c for c in METRIC_COLUMNS if c in df.columns]].groupby(month_key, sort=True).sum()
+    keys = agg.index.to_numpy(dtype='int64')
+    agg.insert(0, 'year_month', [f"{k // 12:04d}-{k % 12 + 1:02d}" for k in keys])
+    agg.insert(1, 'period_date', pd.to_datetime({'year': keys // 12, 'month': keys % 12 + 1, 'day': 1}).to_numpy())
+    return agg.reset_index(drop=True)
+
+
+def extend_monthly_rollup(monthly: pd.DataFrame, df: pd.DataFrame, tail: pd.DataFrame) -> pd.DataFrame:
+    # Only the months the appended rows touch are regrouped; earlier months are final
+    if tail.empty:
+        return monthly
+    first_month = tail['period_date'].iloc[0].to_period('M').start_time
+    keep = int(monthly['period_date'].searchsorted(first_month, side='left'))
+    recent = slice_range(df, first_month, df['period_date'].iloc[-1])
+    return pd.concat([monthly.iloc[:keep], build_monthly_rollup(recent)], ignore_index=True)
+
+
+def range_totals(cube: dict, start: pd.Timestamp, end: pd.Timestamp) -> dict:
+    lo, hi = _range_bounds(cube['period_date'], start, end)
+    return {name: float(cum[hi] - cum[lo]) for name, cum in cube.items() if name != 'period_date'}
+
+
+def partition_totals(parts: list[dict], start: pd.Timestamp, end: pd.Timestamp) -> dict:
+    # range_totals summed over partitions; a range with no data is all zeros
+    totals = dict.fromkeys(ADDITIVE_COLUMNS, 0.0)
+    for part in parts:
+        for name, value in range_totals(part['cumsums'], start, end).items():
+            totals[name] += value
+    return totals
+
+
+def window_totals(parts: list[dict], starts, ends) -> dict:
+    # Sums of each additive column over the inclusive windows [starts[i], ends[i]], vectorized over i
+    # with two binary searches per partition; windows may reach outside the selected range
+    totals = {name: np.zeros(len(starts)) for name in ADDITIVE_COLUMNS}
+    for part in parts:
+        cube = part['cumsums']
+        dates = cube['period_date']
+        lo = dates.searchsorted(pd.DatetimeIndex(starts).to_numpy().astype(dates.dtype), side='left')
+        hi = np.maximum(lo, dates.searchsorted(pd.DatetimeIndex(ends).to_numpy().astype(dates.dtype), side='right'))
+        for name in ADDITIVE_COLUMNS:
+            totals[name] += cube[name][hi] - cube[name][lo]
+    return totals
+
+
+def _trend_columns(totals: dict, days: int, suffix: str) -> dict:
+    # Money as a per-day average over the window, ratios as ratios of the window sums
+    return {
+        f'revenue_{suffix}': totals['revenue'] / days,
+        f'ad_costs_{suffix}': totals['ad_costs'] / days,
+        f'mer_{suffix}': _safe_div(totals['revenue'], totals['ad_costs']),
+        f'cac_{suffix}': _safe_div(totals['ad_costs'], totals['orders']),
+    }
+
+
+def trend_overlays(parts: list[dict], periods, granularity: str, window_days: int | None = None, yoy: bool = False) -> pd.DataFrame:
+    """Overlay series aligned with the plotted periods (day or month starts).
+
+    - '<col>_roll': trailing window_days-day rolling values ending on each day (Daily only)
+    - '<col>_yoy': the same calendar day or month one year earlier
+
+    parts must cover the windows, i.e. start window_days - 1 days and a year before the first period.
+    """
+    periods = pd.DatetimeIndex(periods)
+    out = {}
+    if window_days and granularity == "Daily":
+        totals = window_totals(parts, periods - pd.Timedelta(days=window_days - 1), periods)
+        out.update(_trend_columns(totals, window_days, 'roll'))
+    if yoy:
+        if granularity == "Daily":
+            starts = ends = periods - pd.DateOffset(years=1)
+        else:
+            months = periods.to_period('M') - 12
+            starts, ends = months.start_time, months.end_time.normalize()
+        totals = window_totals(parts, starts, ends)
+        # Previous-year values are plain period totals, like the series they overlay
+        out.update(_trend_columns(totals, 1, 'yoy'))
+    return pd.DataFrame(out, index=range(len(periods)))
+
+
+def compute_metrics(totals: dict, ship_cost: float) -> dict:
+    # KPI card values from range totals (see range_totals)
+    derived = {k: float(v) for k, v in _derived_columns(totals, ship_cost).items()}
+    return {
+        'orders': totals['orders'],
+        'revenue': totals['revenue'],
+        'cogs': totals['cost_of_goods_sold'],
+        'cm2': derived['cm2'],
+        'cm3': derived['cm3'],
+        'ad_costs': totals['ad_costs'],
+        'google': totals['google_costs'],
+        'meta': totals['meta_costs'],
+        'cac': derived['cac'],
+        'mer': derived['mer'],
+        'roi': derived['roi'],
+        'aov': derived['aov'],
+    }
+
+
+PRESETS = [
+    "Custom",
+    "This month",
+    "Last month",
+    "QTD",
+    "YTD",
+    "Last 30d",
+    "Last 60d",
+    "Last 90d",
+]
+
+
+def preset_range(preset_label: str, today, min_date, max_date) -> tuple:
+    # Date range of a quick-range preset relative to `today`, clamped to [min_date, max_date]
+    anchor = pd.to_datetime(today)
+    if preset_label == "This month":
+        p = anchor.to_period('M')
+        s, e = p.start_time.date(), p.end_time.date()
+    elif preset_label == "Last month":
+        prev = (anchor - pd.DateOffset(months=1)).to_period('M')
+        s, e = prev.start_time.date(), prev.end_time.date()
+    elif preset_label == "QTD":
+        q = anchor.to_period('Q')
+        s, e = q.start_time.date(), anchor.date()
+    elif preset_label == "YTD":
+        y = anchor.to_period('Y')
+        s, e = y.start_time.date(), anchor.date()
+    elif preset_label.endswith('d'):
+        days = int(preset_label.split()[1].replace('d',''))
+        s, e = (anchor - timedelta(days=days-1)).date(), anchor.date()
+    else:
+        s, e = (min_date, today)
+    # clamp to UI bounds (data filter will naturally limit to available rows)
+    return (max(s, min_date), min(e, max_date))
+
+
+def compute_prev_range(sel_start: pd.Timestamp, sel_end: pd.Timestamp, preset: str, gran: str) -> tuple[pd.Timestamp, pd.Timestamp]:
+    # Comparison window for the KPI deltas
+    # Helper periods
+    sel_start_m = sel_start.to_period('M')
+    sel_end_m = sel_end.to_period('M')
+    if preset in ("This month", "Last month") and gran == "Monthly":
+        prev_m = sel_start_m - 1
+        return prev_m.start_time, prev_m.end_time
+    if preset == "YTD" and gran == "Monthly":
+        # Jan to current end month of previous year
+        prev_start_y = (sel_start.to_period('Y') - 1).start_time
+        prev_end_y = (sel_end_m - 12).end_time
+        return prev_start_y, prev_end_y
+    if preset == "QTD" and gran == "Monthly":
+        # Previous full quarter
+        curr_q = sel_end.to_period('Q')
+        prev_q = curr_q - 1
+        return prev_q.start_time, prev_q.end_time
+    # Rolling windows like Last 30d/60d/90d or Custom: same-length immediately preceding
+    window_days = (sel_end.normalize() - sel_start.normalize()).days + 1
+    prev_end = sel_start.normalize() - pd.Timedelta(days=1)
+    prev_start = prev_end - pd.Timedelta(days=window_days - 1)
+    return prev_start, prev_end
+
+
+def month_span(start, end, min_date, max_date) -> tuple:
+    # [start, end] widened to whole months, clamped to [min_date, max_date] (Monthly breakdown)
+    s = pd.Timestamp(start).to_period('M').start_time.date()
+    e = pd.Timestamp(end).to_period('M').end_time.date()
+    return (max(min_date, s), min(max_date, e))
+
+
+@lru_cache(maxsize=32)
+def preset_calendar(today, min_date, max_date) -> dict:
+    """Every preset's range and comparison range for one day and data bounds.
+
+    Built once per (today, min_date, max_date) so the sidebar callbacks and the KPI comparison
+    are dictionary lookups. Shared between sessions: treat the result as read-only.
+
+    - 'ranges': preset -> raw (start, end) dates, as in preset_range
+    - 'match': raw (start, end) -> first preset producing it
+    - 'selection': granularity -> preset -> (start, end) the picker shows for it
+    - 'prev': (granularity, preset) -> comparison (start, end) Timestamps of that selection
+    """
+    ranges = {p: preset_range(p, today, min_date, max_date) for p in PRESETS if p != "Custom"}
+    match = {}
+    for p, r in ranges.items():
+        match.setdefault(r, p)
+    selection = {
+        'Daily': dict(ranges),
+        'Monthly': {p: month_span(s, e, min_date, max_date) for p, (s, e) in ranges.items()},
+    }
+    prev = {
+        (gran, p): compute_prev_range(pd.Timestamp(s), pd.Timestamp(e), p, gran)
+        for gran, sels in selection.items()
+        for p, (s, e) in sels.items()
+    }
+    return {'ranges': ranges, 'match': match, 'selection': selection, 'prev': prev}
+
+
+def match_preset(calendar: dict, start, end) -> str:
+    # Preset whose range is exactly [start, end], else "Custom"
+    return calendar['match'].get((start, end), "Custom")
+
+
+def prev_range(calendar: dict, sel_start: pd.Timestamp, sel_end: pd.Timestamp, preset: str, gran: str) -> tuple[pd.Timestamp, pd.Timestamp]:
+    # Comparison window from the calendar when the selection is the preset's own; computed otherwise
+    sel = calendar['selection'].get(gran, {}).get(preset)
+    if sel is not None and sel == (sel_start.date(), sel_end.date()):
+        return calendar['prev'][(gran, preset)]
+    return compute_prev_range(sel_start, sel_end, preset, gran)
+
+
+BREAKDOWN_COLUMNS = ['orders', 'google_costs', 'meta_costs', 'ad_costs', 'revenue', 'cost_of_goods_sold', 'cm2', 'cm3', 'cac', 'mer', 'roi', 'aov']
+
+
+def build_breakdown(data: dict, start: pd.Timestamp, end: pd.Timestamp, granularity: str, ship_cost: float) -> pd.DataFrame:
+    # Breakdown table rows: one per day (Daily) or per month (Monthly, range already whole months)
+    if granularity == "Daily":
+        # Selected range daily rows (already sorted by date), margins from the current shipping cost.
+        # Built in one step; base columns are copied out of the shared frame so a cached table
+        # holds only its own rows, not buffers spanning the partition's whole history.
+        rows = slice_range(data['df'], start, end)
+        columns = {'date': rows['period_date'].dt.strftime('%Y-%m-%d').to_numpy()}
+        columns.update({c: rows[c].to_numpy(copy=True) for c in BREAKDOWN_COLUMNS if c in rows.columns})
+        columns.update(_derived_columns(columns, ship_cost))
+        return pd.DataFrame({c: columns[c] for c in ['date'] + BREAKDOWN_COLUMNS}, copy=False)
+    # Months within the selected range, copied out of the shared rollup like the Daily rows
+    agg = derive_metrics(slice_range(data['monthly'], start, end).copy(), ship_cost)
+    return agg[['year_month'] + BREAKDOWN_COLUMNS].reset_index(drop=True)
+
+
+def partition_breakdown(parts: list[dict], start: pd.Timestamp, end: pd.Timestamp, granularity: str, ship_cost: float) -> pd.DataFrame:
+    # build_breakdown over date-ordered partitions (years never split a month)
+    id_col = 'date' if granularity == "Daily" else 'year_month'
+    frames = [build_breakdown(part, start, end, granularity, ship_cost) for part in parts]
+    if not frames:
+        return pd.DataFrame(columns=[id_col] + BREAKDOWN_COLUMNS)
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+# Long-format ad spend, one row per date x channel x campaign
+COST_COLUMNS = ['date', 'channel', 'campaign', 'cost']
+
+
+def discover_cost_tables(tables_dir: str) -> dict:
+    # {shop: csv path} from tables_dir/marketing_costs/<shop>.csv; a lone marketing_costs.csv is shop 'default'
+    tables = {}
+    root = os.path.join(tables_dir, 'marketing_costs')
+    if os.path.isdir(root):
+        for entry in sorted(os.listdir(root)):
+            if entry.endswith('.csv'):
+                tables[entry[:-len('.csv')]] = os.path.join(root, entry)
+    single = os.path.join(tables_dir, 'marketing_costs.csv')
+    if not tables and os.path.exists(single):
+        tables['default'] = single
+    return tables
+
+
+def build_cost_cube(df: pd.DataFrame) -> dict:
+    """Indexed spend cube of a long-format cost table.
+
+    Rows are summed once per day x channel x campaign. Range lookups then need no groupby:
+    channel totals come from per-channel prefix sums over days, campaign totals from a bincount
+    over the date-sorted rows in range, and one campaign's series from its own contiguous block.
+    Campaigns are identified by (channel, campaign).
+    """
+    day = pd.to_datetime(df['date'], errors='coerce').dt.normalize()
+    g = pd.DataFrame({
+        'period_date': day,
+        'channel': df['channel'].astype(str),
+        'campaign': df['campaign'].fillna('').astype(str),
+        'cost': pd.to_numeric(df['cost'], errors='coerce').fillna(0.0),
+    })[day.notna()]
+    g = g.groupby(['period_date', 'channel', 'campaign'], sort=True)['cost'].sum().reset_index()
+
+    days = np.unique(g['period_date'].to_numpy())
+    row_day = np.searchsorted(days, g['period_date'].to_numpy())
+    channels, row_channel = np.unique(g['channel'].to_numpy(), return_inverse=True)
+    row_campaign, pairs = pd.factorize(pd.MultiIndex.from_arrays([g['channel'], g['campaign']]), sort=True)
+    campaigns = pd.DataFrame({'channel': pairs.get_level_values(0), 'campaign': pairs.get_level_values(1)})
+    cost = g['cost'].to_numpy(dtype='float64')
+
+    # days x channels spend with a leading zero row
+    per_day = np.bincount(row_day * len(channels) + row_channel, weights=cost, minlength=len(days) * len(channels))
+    channel_cum = np.vstack([np.zeros((1, len(channels))), np.cumsum(per_day.reshape(len(days), len(channels)), axis=0)])
+
+    # Rows regrouped by campaign (dates ascending within each), with running totals
+    order = np.lexsort((row_day, row_campaign))
+    return {
+        'days': days,
+        'channels': list(channels),
+        'campaigns': campaigns,
+        'campaign_channel': np.searchsorted(channels, campaigns['channel'].to_numpy()),
+        'channel_cum': channel_cum,
+        'row_day': row_day,
+        'row_campaign': row_campaign,
+        'row_cost': cost,
+        'block_offsets': np.searchsorted(row_campaign[order], np.arange(len(campaigns) + 1)),
+        'block_day': row_day[order],
+        'block_cum': np.concatenate(([0.0], np.cumsum(cost[order]))),
+    }
+
+
+def _cube_nbytes(cube: dict) -> int:
+    return int(
+        sum(v.nbytes for v in cube.values() if isinstance(v, np.ndarray))
+        + cube['campaigns'].memory_usage(deep=True).sum()
+    )
+
+
+def load_cost_cube(path: str, mtime: float, size: int) -> dict:
+    # Cube for one file version; shared between sessions, treat as read-only. Kept in the
+    # registry under its path, so it counts against CACHE_BUDGET_BYTES and a new file version
+    # replaces the previous cube.
+    with _registry_lock:
+        path_lock = _path_locks.setdefault(path, threading.Lock())
+    with path_lock:
+        with _registry_lock:
+            prev = _registry.get(path)
+            if prev is not None and prev['mtime'] == mtime and prev['size'] == size:
+                _registry.move_to_end(path)
+                return prev['cube']
+        cube = build_cost_cube(pd.read_csv(path, usecols=COST_COLUMNS))
+        _store(path, {'cube': cube, 'mtime': mtime, 'size': size, 'nbytes': _cube_nbytes(cube), 'loaded_at': time.time()})
+        return cube
+
+
+def _cube_days(cube: dict, start: pd.Timestamp, end: pd.Timestamp) -> tuple[int, int]:
+    return _range_bounds(cube['days'], start, end)
+
+
+def cost_totals(cube: dict, start: pd.Timestamp, end: pd.Timestamp, channel: str | None = None) -> pd.Series:
+    # Spend in start..end per channel, or per campaign of `channel`, largest first
+    d_lo, d_hi = _cube_days(cube, start, end)
+    if channel is None:
+        totals = cube['channel_cum'][d_hi] - cube['channel_cum'][d_lo]
+        return pd.Series(totals, index=pd.Index(cube['channels'], name='channel'), name='cost').sort_values(ascending=False)
+    lo, hi = np.searchsorted(cube['row_day'], [d_lo, d_hi])
+    totals = np.bincount(cube['row_campaign'][lo:hi], weights=cube['row_cost'][lo:hi], minlength=len(cube['campaigns']))
+    mask = cube['campaign_channel'] == cube['channels'].index(channel)
+    names = pd.Index(cube['campaigns']['campaign'].to_numpy()[mask], name='campaign')
+    return pd.Series(totals[mask], index=names, name='cost').sort_values(ascending=False)
+
+
+def cost_series(cube: dict, start: pd.Timestamp, end: pd.Timestamp, granularity: str,
+                channel: str | None = None, campaign: str | None = None) -> pd.DataFrame:
+    # Spend per day (Daily) or month (Monthly) in start..end for all channels, one channel or one campaign;
+    # one column per channel when no channel is chosen
+    d_lo, d_hi = _cube_days(cube, start, end)
+    if campaign is not None:
+        mask = (cube['campaigns']['channel'] == channel).to_numpy() & (cube['campaigns']['campaign'] == campaign).to_numpy()
+        k = int(np.flatnonzero(mask)[0])
+        b_lo, b_hi = cube['block_offsets'][k], cube['block_offsets'][k + 1]
+        lo, hi = b_lo + np.searchsorted(cube['block_day'][b_lo:b_hi], [d_lo, d_hi])
+        days = cube['days'][cube['block_day'][lo:hi]]
+        values = {campaign: np.diff(cube['block_cum'][lo:hi + 1])}
+    else:
+        days = cube['days'][d_lo:d_hi]
+        per_day = np.diff(cube['channel_cum'][d_lo:d_hi + 1], axis=0)
+        if channel is not None:
+            values = {channel: per_day[:, cube['channels'].index(channel)]}
+        else:
+            values = dict(zip(cube['channels'], per_day.T))
+    out = pd.DataFrame(values, index=pd.DatetimeIndex(days, name='period_date'))
+    if granularity == "Daily":
+        out.insert(0, 'date', out.index.strftime('%Y-%m-%d'))
+        return out.reset_index(drop=True)
+    # Range-limited rows only: at most one per day of the selection
+    out = out.groupby(out.index.to_period('M')).sum()
+    out.insert(0, 'year_month', out.index.strftime('%Y-%m'))
+    return out.reset_index(drop=True)
@@ -0,0 +1,95 @@
+"""Download files of the breakdown table and the raw rows of a range.
+
+Files are written chunk by chunk, so no formatted copy of the whole frame is ever built. Numbers
+use the table's 2-decimal format. Importable without Streamlit, like dataset.py.
+"""
+import io
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+import dataset as ds
+
+try:
+    import xlsxwriter
+except ImportError:  # XLSX export is optional; without xlsxwriter only CSV is offered
+    xlsxwriter = None
+
+# Rows formatted per chunk
+EXPORT_CHUNK_ROWS = 50_000
+# Rows of an Excel worksheet, header included; xlsxwriter silently skips cells beyond it
+XLSX_MAX_ROWS = 1_048_576
+
+
+def _chunks(frames: Iterable[pd.DataFrame], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for frame in frames:
+        for lo in range(0, len(frame), chunk_rows):
+            yield frame.iloc[lo:lo + chunk_rows]
+
+
+def _as_float(chunk: pd.DataFrame) -> pd.DataFrame:
+    # Every numeric column at 2 decimals, counts included, as in the on-screen table
+    return chunk.astype({c: 'float64' for c in chunk.columns if c not in ds.LABEL_COLUMNS})
+
+
+def iter_csv(frames: Iterable[pd.DataFrame], columns: list[str], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    # UTF-8 CSV of the concatenated frames, one encoded chunk at a time
+    yield pd.DataFrame(columns=columns).to_csv(index=False).encode()
+    for chunk in _chunks(frames, chunk_rows):
+        yield _as_float(chunk.reindex(columns=columns)).to_csv(index=False, header=False, float_format='%.2f').encode()
+
+
+def csv_bytes(frames: Iterable[pd.DataFrame], columns: list[str]) -> bytes:
+    return b''.join(iter_csv(frames, columns))
+
+
+def xlsx_fits(n_rows: int) -> bool:
+    # Whether n_rows data rows plus the header fit on one worksheet
+    return n_rows + 1 <= XLSX_MAX_ROWS
+
+
+def xlsx_bytes(frames: Iterable[pd.DataFrame], columns: list[str], sheet: str = 'data') -> bytes:
+    # Workbook written row by row in xlsxwriter's constant-memory mode; numbers stay numeric.
+    # A Python loop per cell holding the GIL (~80 us per row): callers keep large ranges to CSV.
+    out = io.BytesIO()
+    book = xlsxwriter.Workbook(out, {'constant_memory': True})
+    money = book.add_format({'num_format': '0.00'})
+    ws = book.add_worksheet(sheet)
+    ws.write_row(0, 0, columns)
+    row = 1
+    for chunk in _chunks(frames, EXPORT_CHUNK_ROWS):
+        if not xlsx_fits(row - 1 + len(chunk)):
+            raise ValueError(f"more than {XLSX_MAX_ROWS - 1} rows do not fit on an XLSX sheet")
+        chunk = _as_float(chunk.reindex(columns=columns))
+        for values in chunk.itertuples(index=False, name=None):
+            for col, value in enumerate(values):
+                if columns[col] in ds.LABEL_COLUMNS:
+                    ws.write_string(row, col, str(value))
+                elif pd.notna(value):
+                    ws.write_number(row, col, value, money)
+            row += 1
+    book.close()
+    return out.getvalue()
+
+
+def raw_columns(parts: list[dict]) -> list[str]:
+    # Input columns of a shop's partitions: the date label and the metric columns present
+    if not parts:
+        return ['date'] + ds.METRIC_COLUMNS
+    label = parts[0]['label']
+    return [label] + [c for c in ds.METRIC_COLUMNS if c in parts[0]['df'].columns]
+
+
+def raw_row_count(parts: list[dict], start: pd.Timestamp, end: pd.Timestamp) -> int:
+    # Rows raw_frames yields, from the range bounds only
+    return sum(len(ds.slice_range(part['df'], start, end)) for part in parts)
+
+
+def raw_frames(parts: list[dict], start: pd.Timestamp, end: pd.Timestamp) -> Iterator[pd.DataFrame]:
+    # Loaded rows of each partition within start..end, chunk by chunk with the date label
+    # formatted back from period_date (the loaded frame does not keep the source strings)
+    for part in parts:
+        rows = ds.slice_range(part['df'], start, end)
+        fmt = '%Y-%m-%d' if part['label'] == 'date' else '%Y-%m'
+        for chunk in _chunks([rows], EXPORT_CHUNK_ROWS):
+            yield chunk.assign(**{part['label']: chunk['period_date'].dt.strftime(fmt)})
@@ -0,0 +1,138 @@
+"""Per-rerun timing spans for the dashboard's hot path.
+
+Each rerun records named spans (wall time, row count, RSS delta), appends them as one JSON
+line to DASHBOARD_PERF_LOG and feeds a process-wide window used for latency percentiles.
+The log rolls over to a single '.1' file at DASHBOARD_PERF_LOG_MB, so it stays bounded.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# JSON-lines log of every rerun; set DASHBOARD_PERF_LOG to '' to disable
+LOG_PATH = os.environ.get('DASHBOARD_PERF_LOG', os.path.join(tempfile.gettempdir(), 'dashboard_perf.jsonl'))
+# Size at which the log is moved to LOG_PATH + '.1' (replacing the previous one) and restarted
+LOG_MAX_BYTES = int(float(os.environ.get('DASHBOARD_PERF_LOG_MB', '16')) * 1e6)
+# Reruns kept per stage for percentiles
+WINDOW = 1000
+
+_history: dict = defaultdict(lambda: deque(maxlen=WINDOW))
+_lock = threading.Lock()
+# Cold-start figures of this process, filled by the first finished rerun
+startup: dict = {}
+
+
+def _rss_bytes() -> int | None:
+    # Resident set size from /proc (Linux); None where unavailable
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _process_age_ms() -> float | None:
+    # Milliseconds since this process started, from /proc (Linux); None where unavailable
+    try:
+        with open('/proc/self/stat') as fh:
+            started_ticks = int(fh.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as fh:
+            uptime = float(fh.read().split()[0])
+        return (uptime - started_ticks / os.sysconf('SC_CLK_TCK')) * 1000.0
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _append_log(line: str) -> None:
+    # Called under _lock; at most LOG_MAX_BYTES in the live file plus one rolled-over file
+    try:
+        if os.path.getsize(LOG_PATH) >= LOG_MAX_BYTES:
+            os.replace(LOG_PATH, LOG_PATH + '.1')
+    except OSError:
+        pass
+    try:
+        with open(LOG_PATH, 'a') as fh:
+            fh.write(line + '\n')
+    except OSError:
+        pass
+
+
+class Rerun:
+    """Spans of one script run, in execution order."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._rss0 = _rss_bytes()
+        self.spans: list[dict] = []
+        self.finished = False
+
+    @contextmanager
+    def span(self, name: str):
+        # Yields the span record so the caller can attach 'rows' (or other fields)
+        record = {'stage': name, 'rows': None}
+        rss = _rss_bytes()
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['ms'] = (time.perf_counter() - t0) * 1000.0
+            after = _rss_bytes()
+            record['rss_delta_mb'] = (after - rss) / 1e6 if rss is not None and after is not None else None
+            self.spans.append(record)
+
+    def add(self, name: str, ms: float, rows: int | None = None) -> None:
+        # Span measured by the caller (e.g. module imports timed before this object existed)
+        self.spans.append({'stage': name, 'rows': rows, 'ms': ms, 'rss_delta_mb': None})
+
+    def finish(self, **context) -> dict:
+        # Closes the rerun: records percentiles input and appends the JSON line
+        self.finished = True
+        total_ms = (time.perf_counter() - self._t0) * 1000.0
+        rss = _rss_bytes()
+        entry = {
+            'ts': self.started,
+            'total_ms': total_ms,
+            'rss_mb': rss / 1e6 if rss is not None else None,
+            'rss_delta_mb': (rss - self._rss0) / 1e6 if rss is not None and self._rss0 is not None else None,
+            'spans': self.spans,
+            **context,
+        }
+        with _lock:
+            if not startup:
+                # First page served by this process: import time and process start to first render
+                imports_ms = next((r['ms'] for r in self.spans if r['stage'] == 'imports'), 0.0)
+                startup.update({
+                    'imports_ms': imports_ms,
+                    'first_render_ms': imports_ms + total_ms,
+                    'process_age_ms': _process_age_ms(),
+                })
+                entry['startup'] = dict(startup)
+            # Fragment-only reruns are much shorter than full ones; keep their totals apart
+            total_key = f"fragment:{context['fragment']}" if context.get('fragment') else 'total'
+            _history[total_key].append(total_ms)
+            for record in self.spans:
+                _history[record['stage']].append(record['ms'])
+            if LOG_PATH:
+                _append_log(json.dumps(entry, default=str))
+        return entry
+
+
+def percentiles() -> dict:
+    # {stage: {'n', 'p50', 'p95', 'p99'}} in ms over the last WINDOW reruns
+    with _lock:
+        samples = {stage: np.array(values) for stage, values in _history.items() if values}
+    return {
+        stage: {
+            'n': len(values),
+            'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)),
+            'p99': float(np.percentile(values, 99)),
+        }
+        for stage, values in samples.items()
+    }
@@ -0,0 +1,95 @@
+"""Process-wide LRU cache of rendered view results (KPI values, breakdown tables, figures).
+
+Entries are scoped per shop and keyed by that shop's data version; a new version drops the
+scope's entries. A version older than the scope's current one (a caller that has not seen the
+swap yet) is computed but neither stored nor allowed to move the scope back. Values are shared
+by all sessions and must be treated as read-only.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+BUDGET_BYTES = int(float(os.environ.get('DASHBOARD_RESULT_CACHE_MB', '128')) * 1e6)
+# Superseded versions remembered per scope
+SUPERSEDED_KEEP = 16
+
+_entries: OrderedDict = OrderedDict()  # (scope, version, key) -> (value, nbytes)
+_versions: dict = {}  # scope -> data version the scope's entries were computed from
+_superseded: dict = {}  # scope -> recent versions replaced by a newer one, oldest first
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+_total_bytes = 0
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, 'to_plotly_json'):
+        # Figures are sized by their serialized form, which is what gets sent to the browser
+        return len(value.to_json(validate=False))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + _nbytes(v) for k, v in value.items())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _drop(full_key) -> None:
+    global _total_bytes
+    _, nbytes = _entries.pop(full_key)
+    _total_bytes -= nbytes
+
+
+def get_or_compute(scope, version, key, compute):
+    # Cached value for (scope, key) at `version`, computing and storing it on a miss
+    full_key = (scope, version, key)
+    with _lock:
+        current = _versions.get(scope)
+        if current != version and version not in _superseded.get(scope, ()):
+            # First sight of a new version: the scope's entries are stale
+            stale = [k for k in _entries if k[0] == scope]
+            for k in stale:
+                _drop(k)
+            _counters['invalidations'] += len(stale)
+            if current is not None:
+                superseded = _superseded.setdefault(scope, [])
+                superseded.append(current)
+                del superseded[:-SUPERSEDED_KEEP]
+            _versions[scope] = version
+        hit = _entries.get(full_key)
+        if hit is not None:
+            _entries.move_to_end(full_key)
+            _counters['hits'] += 1
+            return hit[0]
+        _counters['misses'] += 1
+
+    value = compute()
+    nbytes = _nbytes(value)
+
+    global _total_bytes
+    with _lock:
+        # Skip storing if the data moved on while computing or the value alone exceeds the budget
+        if _versions.get(scope) == version and nbytes <= BUDGET_BYTES and full_key not in _entries:
+            _entries[full_key] = (value, nbytes)
+            _total_bytes += nbytes
+            while _total_bytes > BUDGET_BYTES:
+                _drop(next(iter(_entries)))
+                _counters['evictions'] += 1
+    return value
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_counters, 'entries': len(_entries), 'bytes': _total_bytes, 'budget_bytes': BUDGET_BYTES}
+
+
+def clear() -> None:
+    global _total_bytes
+    with _lock:
+        _entries.clear()
+        _versions.clear()
+        _superseded.clear()
+        _total_bytes = 0
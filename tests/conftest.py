@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset as ds  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _fresh_registry():
+    # Loaded versions are process-wide; every test starts cold
+    ds.reset_registry()
+    yield
+    ds.reset_registry()
+
+
+@pytest.fixture
+def metrics_table():
+    # Synthetic marketing_metrics rows, one per day from `start`
+    def make(days: int, start: str = '2024-01-01', seed: int = 0) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        dates = pd.date_range(start, periods=days, freq='D')
+        orders = rng.integers(0, 80, days)
+        revenue = np.round(orders * rng.uniform(30, 90, days), 2)
+        google = np.round(rng.uniform(0, 300, days), 2)
+        meta = np.round(rng.uniform(0, 250, days), 2)
+        return pd.DataFrame({
+            'date': dates.strftime('%Y-%m-%d'),
+            'orders': orders,
+            'google_costs': google,
+            'meta_costs': meta,
+            'ad_costs': np.round(google + meta, 2),
+            'revenue': revenue,
+            'cost_of_goods_sold': np.round(revenue * 0.55, 2),
+        })
+    return make
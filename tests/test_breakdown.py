@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset as ds
+
+
+@pytest.mark.parametrize('granularity,source', [('Daily', 'df'), ('Monthly', 'monthly')])
+def test_breakdown_does_not_pin_the_shared_frame(metrics_table, granularity, source):
+    # Cached breakdowns must own their rows: views would keep the whole partition alive after eviction
+    df = ds._normalize(metrics_table(900))
+    data = {'df': df, 'monthly': ds.build_monthly_rollup(df)}
+    table = ds.build_breakdown(data, pd.Timestamp('2024-03-01'), pd.Timestamp('2024-04-30'), granularity, 1.5)
+    assert len(table)
+    for col in ds.METRIC_COLUMNS:
+        if col in table.columns:
+            assert not np.shares_memory(table[col].to_numpy(), data[source][col].to_numpy()), col
@@ -0,0 +1,45 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import dataset as ds
+
+MIN_DATE = date(2021, 3, 10)
+DATA_END = date(2023, 6, 30)
+
+
+def _old_match(today, min_date, max_date, s, e) -> str:
+    # The sidebar's per-option loop the calendar replaced
+    for opt in ds.PRESETS:
+        if opt != "Custom" and ds.preset_range(opt, today, min_date, max_date) == (s, e):
+            return opt
+    return "Custom"
+
+
+@pytest.mark.parametrize('year', [2022, 2023, 2024, 2025])
+def test_calendar_matches_direct_computation(year):
+    # Every day of the year as 'today', with the picker's upper bound max(today, last data day)
+    for today in pd.date_range(f'{year}-01-01', f'{year}-12-31').date:
+        max_date = max(today, DATA_END)
+        cal = ds.preset_calendar(today, MIN_DATE, max_date)
+        for preset in ds.PRESETS[1:]:
+            s, e = ds.preset_range(preset, today, MIN_DATE, max_date)
+            assert cal['ranges'][preset] == (s, e)
+            assert ds.match_preset(cal, s, e) == _old_match(today, MIN_DATE, max_date, s, e)
+            for gran, (sel_s, sel_e) in (('Daily', (s, e)), ('Monthly', ds.month_span(s, e, MIN_DATE, max_date))):
+                assert cal['selection'][gran][preset] == (sel_s, sel_e)
+                sel_start, sel_end = pd.Timestamp(sel_s), pd.Timestamp(sel_e)
+                assert ds.prev_range(cal, sel_start, sel_end, preset, gran) == \
+                    ds.compute_prev_range(sel_start, sel_end, preset, gran)
+
+
+def test_custom_selection_falls_back_to_computation():
+    today = date(2024, 5, 17)
+    cal = ds.preset_calendar(today, MIN_DATE, today)
+    assert ds.match_preset(cal, date(2024, 2, 3), date(2024, 4, 9)) == "Custom"
+    sel_start, sel_end = pd.Timestamp('2024-02-03'), pd.Timestamp('2024-04-09')
+    for preset in ds.PRESETS:
+        for gran in ('Daily', 'Monthly'):
+            assert ds.prev_range(cal, sel_start, sel_end, preset, gran) == \
+                ds.compute_prev_range(sel_start, sel_end, preset, gran)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset as ds
+
+START, END = pd.Timestamp('2024-02-10'), pd.Timestamp('2024-07-03')
+
+
+@pytest.fixture(scope='module')
+def costs() -> pd.DataFrame:
+    # Long-format spend with repeated day x campaign rows, gaps and a missing campaign name
+    rng = np.random.default_rng(1)
+    n = 20_000
+    channels = np.array(['google', 'meta', 'tiktok'])
+    channel = channels[rng.integers(0, 3, n)]
+    campaign = np.char.add(channel, np.char.mod('-%d', rng.integers(0, 12, n))).astype(object)
+    campaign[rng.random(n) < 0.02] = None
+    dates = pd.Timestamp('2023-11-01') + pd.to_timedelta(rng.integers(0, 400, n), unit='D')
+    return pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'channel': channel,
+        'campaign': campaign,
+        'cost': np.round(rng.uniform(0, 120, n), 2),
+    })
+
+
+@pytest.fixture(scope='module')
+def in_range(costs) -> pd.DataFrame:
+    dates = pd.to_datetime(costs['date'])
+    return costs[(dates >= START) & (dates <= END)].assign(
+        period_date=dates, campaign=costs['campaign'].fillna(''),
+    )
+
+
+def test_channel_totals_match_groupby(costs, in_range):
+    cube = ds.build_cost_cube(costs)
+    expected = in_range.groupby('channel')['cost'].sum()
+    got = ds.cost_totals(cube, START, END)
+    pd.testing.assert_series_equal(got.sort_index(), expected.sort_index(), check_names=False)
+    assert got.is_monotonic_decreasing
+
+
+def test_campaign_totals_match_groupby(costs, in_range):
+    cube = ds.build_cost_cube(costs)
+    for channel, rows in in_range.groupby('channel'):
+        expected = rows.groupby('campaign')['cost'].sum()
+        got = ds.cost_totals(cube, START, END, channel)
+        # Campaigns without spend in the range are listed with zero
+        got = got[got.index.isin(expected.index)]
+        pd.testing.assert_series_equal(got.sort_index(), expected.sort_index(), check_names=False)
+
+
+@pytest.mark.parametrize('granularity,freq,label,fmt', [
+    ('Daily', 'D', 'date', '%Y-%m-%d'),
+    ('Monthly', 'M', 'year_month', '%Y-%m'),
+])
+def test_series_match_groupby(costs, in_range, granularity, freq, label, fmt):
+    cube = ds.build_cost_cube(costs)
+    key = in_range['period_date'].dt.to_period(freq).dt.strftime(fmt)
+
+    expected = in_range.groupby([key, 'channel'])['cost'].sum().unstack(fill_value=0.0)
+    got = ds.cost_series(cube, START, END, granularity).set_index(label)
+    pd.testing.assert_frame_equal(got, expected, check_names=False)
+
+    google = in_range['channel'] == 'google'
+    expected = in_range[google].groupby(key[google])['cost'].sum()
+    got = ds.cost_series(cube, START, END, granularity, channel='google').set_index(label)['google']
+    pd.testing.assert_series_equal(got[got.index.isin(expected.index)], expected, check_names=False)
+
+    one = google & (in_range['campaign'] == 'google-3')
+    expected = in_range[one].groupby(key[one])['cost'].sum()
+    got = ds.cost_series(cube, START, END, granularity, channel='google', campaign='google-3').set_index(label)['google-3']
+    pd.testing.assert_series_equal(got, expected, check_names=False)
+
+
+def test_cubes_live_in_the_registry(tmp_path, costs):
+    path = str(tmp_path / 'marketing_costs.csv')
+    costs.iloc[:1000].to_csv(path, index=False)
+    cube = ds.load_cost_cube(path, 1.0, 1)
+    assert ds.load_cost_cube(path, 1.0, 1) is cube
+    assert ds._registry[path]['nbytes'] > 0
+
+    # A new file version replaces the previous cube instead of sitting next to it
+    costs.to_csv(path, index=False)
+    newer = ds.load_cost_cube(path, 2.0, 2)
+    assert newer is not cube and ds._registry[path]['cube'] is newer
+    assert len(ds._registry) == 1
@@ -0,0 +1,93 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset as ds
+
+
+def _load(path: str) -> dict:
+    st = os.stat(path)
+    return ds.load_dataset(path, st.st_mtime, st.st_size)
+
+
+def _assert_matches_full_load(data: dict, path: str) -> None:
+    # Same frame, running totals and monthly rollup as parsing the whole file
+    expected = ds._read_csv(path)
+    pd.testing.assert_frame_equal(data['df'], expected)
+    cumsums = ds.build_cumsums(expected)
+    assert data['cumsums'].keys() == cumsums.keys()
+    for name, values in cumsums.items():
+        np.testing.assert_allclose(data['cumsums'][name].astype('float64'), values.astype('float64'))
+    pd.testing.assert_frame_equal(data['monthly'], ds.build_monthly_rollup(expected))
+
+
+def _no_full_load(*args, **kwargs):
+    raise AssertionError('expected the append path, not a full reload')
+
+
+def test_append_equals_full_reload(tmp_path, metrics_table, monkeypatch):
+    path = str(tmp_path / 'marketing_metrics.csv')
+    table = metrics_table(400)
+    table.iloc[:300].to_csv(path, index=False)
+    _load(path)
+
+    table.iloc[300:].to_csv(path, mode='a', header=False, index=False)
+    monkeypatch.setattr(ds, '_load_frame', _no_full_load)
+    _assert_matches_full_load(_load(path), path)
+
+
+def test_append_after_sidecar_cold_start(tmp_path, metrics_table, monkeypatch):
+    # The digest comes from the sidecar, so a cold start never hashes the CSV and appends still work
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'marketing_metrics.csv')
+    table = metrics_table(400)
+    table.iloc[:300].to_csv(path, index=False)
+    _load(path)
+    ds.reset_registry()
+    with monkeypatch.context() as m:
+        m.setattr(ds, '_hash_prefix', _no_full_load)
+        m.setattr(ds, '_read_csv', _no_full_load)
+        assert _load(path)['digest'] is not None
+
+    table.iloc[300:].to_csv(path, mode='a', header=False, index=False)
+    monkeypatch.setattr(ds, '_load_frame', _no_full_load)
+    _assert_matches_full_load(_load(path), path)
+
+
+def test_rewritten_prefix_reloads_in_full(tmp_path, metrics_table):
+    path = str(tmp_path / 'marketing_metrics.csv')
+    table = metrics_table(400)
+    table.iloc[:300].to_csv(path, index=False)
+    _load(path)
+
+    # Older rows restated and new rows added: the file grew but its prefix changed
+    table.loc[0, 'revenue'] += 1000.0
+    table.to_csv(path, index=False)
+    _assert_matches_full_load(_load(path), path)
+
+
+def test_failed_refresh_is_not_retried_until_the_file_changes(tmp_path, metrics_table, monkeypatch):
+    path = str(tmp_path / 'marketing_metrics.csv')
+    metrics_table(100).to_csv(path, index=False)
+    served = ds._load_path(path)
+
+    with open(path, 'w') as fh:
+        fh.write('unexpected\n1\n')
+    assert ds._load_path(path) is served
+    deadline = time.monotonic() + 10
+    while ds.refresh_status([path])['refreshing'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ds.refresh_status([path])['error'] is not None
+
+    started = []
+    monkeypatch.setattr(ds, '_start_refresh', lambda *args: started.append(args))
+    assert ds._load_path(path) is served
+    assert started == []
+
+    with open(path, 'a') as fh:
+        fh.write('2\n')
+    assert ds._load_path(path) is served
+    assert len(started) == 1
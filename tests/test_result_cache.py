@@ -0,0 +1,47 @@
+import pytest
+
+import result_cache as rc
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    rc.clear()
+    yield
+    rc.clear()
+
+
+def _counter():
+    calls = []
+
+    def compute():
+        calls.append(None)
+        return len(calls)
+    return compute, calls
+
+
+def test_new_version_invalidates_the_scope():
+    compute, calls = _counter()
+    invalidations = rc.stats()['invalidations']
+    assert rc.get_or_compute('shop', 'v1', 'k', compute) == 1
+    assert rc.get_or_compute('shop', 'v1', 'k', compute) == 1
+    assert rc.get_or_compute('shop', 'v2', 'k', compute) == 2
+    assert rc.stats()['invalidations'] == invalidations + 1
+
+
+def test_stale_version_never_moves_the_scope_back():
+    # A fragment that has not seen the swap asks with the old version in between new-version reads
+    compute, calls = _counter()
+    invalidations = rc.stats()['invalidations']
+    rc.get_or_compute('shop', 'v1', 'k', compute)
+    assert rc.get_or_compute('shop', 'v2', 'k', compute) == 2
+    assert rc.get_or_compute('shop', 'v1', 'k', compute) == 3
+    assert rc.get_or_compute('shop', 'v2', 'k', compute) == 2
+    assert rc.stats()['invalidations'] == invalidations + 1
+    assert rc.stats()['entries'] == 1
+
+
+def test_scopes_are_independent():
+    compute, calls = _counter()
+    rc.get_or_compute('a', 'v1', 'k', compute)
+    rc.get_or_compute('b', 'v9', 'k', compute)
+    assert rc.get_or_compute('a', 'v1', 'k', compute) == 1
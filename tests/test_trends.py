@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset as ds
+
+
+@pytest.fixture(scope='module')
+def daily():
+    # Daily rows with missing days and a few days split over two rows, in two year partitions
+    rng = np.random.default_rng(2)
+    dates = pd.date_range('2022-06-01', '2024-06-30', freq='D')
+    dates = dates[rng.random(len(dates)) > 0.1]
+    dates = dates.append(dates[rng.integers(0, len(dates), 20)]).sort_values()
+    n = len(dates)
+    df = ds._normalize(pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'orders': rng.integers(0, 50, n),
+        'google_costs': np.round(rng.uniform(0, 300, n), 2) * (rng.random(n) > 0.05),
+        'meta_costs': np.round(rng.uniform(0, 200, n), 2) * (rng.random(n) > 0.05),
+        'revenue': np.round(rng.uniform(0, 4000, n), 2),
+    }))
+    split = int(df['period_date'].searchsorted(pd.Timestamp('2024-01-01')))
+    parts = [{'cumsums': ds.build_cumsums(df.iloc[:split])}, {'cumsums': ds.build_cumsums(df.iloc[split:])}]
+    # Per calendar day totals, zero on days without rows
+    totals = df.groupby('period_date')[['orders', 'revenue', 'ad_costs']].sum()
+    totals = totals.reindex(pd.date_range('2021-01-01', '2024-12-31'), fill_value=0)
+    return parts, df, totals
+
+
+def _expected(sums: pd.DataFrame, days: int, suffix: str) -> dict:
+    return {
+        f'revenue_{suffix}': sums['revenue'].to_numpy() / days,
+        f'ad_costs_{suffix}': sums['ad_costs'].to_numpy() / days,
+        f'mer_{suffix}': ds._safe_div(sums['revenue'], sums['ad_costs']),
+        f'cac_{suffix}': ds._safe_div(sums['ad_costs'], sums['orders']),
+    }
+
+
+def _assert_columns(got: pd.DataFrame, expected: dict) -> None:
+    for col, values in expected.items():
+        np.testing.assert_allclose(got[col].to_numpy(), values, rtol=1e-9, atol=1e-6, err_msg=col)
+
+
+@pytest.mark.parametrize('window', [7, 28])
+def test_rolling_matches_pandas_rolling(daily, window):
+    parts, df, totals = daily
+    # Plotted x of a Daily breakdown: one per row, so days split over rows repeat
+    periods = ds.slice_range(df, pd.Timestamp('2023-10-01'), pd.Timestamp('2024-03-31'))['period_date']
+    got = ds.trend_overlays(parts, periods, 'Daily', window_days=window)
+    rolled = totals.rolling(window, min_periods=1).sum().loc[periods]
+    _assert_columns(got, _expected(rolled, window, 'roll'))
+    assert not any(c.endswith('_yoy') for c in got.columns)
+
+
+def test_daily_previous_year_matches_shifted_days(daily):
+    parts, df, totals = daily
+    periods = pd.date_range('2024-01-15', '2024-03-31')
+    got = ds.trend_overlays(parts, periods, 'Daily', yoy=True)
+    # 29 February maps to 28 February, as DateOffset does
+    _assert_columns(got, _expected(totals.loc[periods - pd.DateOffset(years=1)], 1, 'yoy'))
+
+
+def test_monthly_previous_year_matches_shifted_months(daily):
+    parts, df, totals = daily
+    periods = pd.date_range('2023-07-01', '2024-06-01', freq='MS')
+    got = ds.trend_overlays(parts, periods, 'Monthly', window_days=7, yoy=True)
+    months = totals.groupby(totals.index.to_period('M')).sum()
+    _assert_columns(got, _expected(months.loc[periods.to_period('M') - 12], 1, 'yoy'))
+    # Rolling windows are Daily only
+    assert not any(c.endswith('_roll') for c in got.columns)